@@ -0,0 +1,301 @@
+"""
+Long-running HTTP/JSON service aligning connectors of ad-hoc sentence triples.
+
+The connector lexicon is loaded once at startup. Triples of concurrent
+requests are collected into batches, which are processed by a bounded pool
+of worker processes:
+
+    python3 alignment_server.py --port 8765 --workers 4
+
+    POST /align  {"triples": [{"de": "...", "en": "...", "it": "..."}],
+                  "alignment": "greedy", "html": false}
+    POST /align  {"ids": [0, 17], ...}  (triples of the --corpus by index)
+
+Triples may have any languages (the same in every triple of a request), the
+lexicon is loaded for the languages given with --langs. Requests with
+sentences that are not strings are answered with 400, requests not aligned
+within --timeout seconds with 504.
+
+    GET  /health
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Pool
+from binary_corpus import BinaryCorpus
+from corpus_reader import LANGS, parallel_sent_type
+from corpus_to_html import ALIGNMENT_METHODS, align_batch
+from lexicon import load_language_matchers
+
+
+class AlignmentService:
+    """
+    Batches the triples of concurrent requests (up to max_batch triples or
+    max_wait seconds) and aligns them in a pool of worker processes. At most
+    two batches per worker are in flight and at most max_pending requests wait
+    for a batch, submit raises queue.Full beyond. The requests of a batch are
+    aligned one by one, so that an error only fails its own request, and
+    batches not done after timeout seconds (e.g. of a dead worker) fail with
+    TimeoutError and the pool is replaced.
+    """
+
+    def __init__(self, connector_matcher, workers=2, max_batch=64,
+                 max_wait=0.005, max_pending=1024, corpus=None, timeout=30.0):
+        self.connector_matcher = connector_matcher
+        # binary_corpus.BinaryCorpus whose triples can be requested by index
+        self.corpus = corpus
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.workers = workers
+        self.pool = self._new_pool()
+        self.requests = queue.Queue(max_pending)
+        self._in_flight = threading.BoundedSemaphore(2 * max(workers, 1))
+        self._batcher = threading.Thread(target=self._batch_loop, daemon=True)
+        self._batcher.start()
+
+    def submit(self, triples, alignment='greedy', html=False):
+        """Returns a Future of the align_batch results of a request."""
+        future = Future()
+        self.requests.put_nowait((triples, (alignment, html), future))
+        return future
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+
+    def _new_pool(self):
+        if self.workers <= 0:
+            return None
+        return Pool(self.workers, initializer=_init_worker,
+                    initargs=(self.connector_matcher,))
+
+    def _replace_pool(self):
+        # a worker killed while taking a task can leave the pool stuck, so
+        # the batches still in the old pool are given up (and time out)
+        pool, self.pool = self.pool, self._new_pool()
+        threading.Thread(target=pool.terminate, daemon=True).start()
+
+    def _batch_loop(self):
+        while True:
+            batch = [self.requests.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                try:
+                    request = self.requests.get(
+                        timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request[0])
+            # requests with the same options share one batch
+            by_options = dict()
+            for request in batch:
+                by_options.setdefault(request[1], []).append(request)
+            for options, requests in by_options.items():
+                self._run(requests, options)
+
+    def _run(self, requests, options):
+        """Aligns the triples of requests in one batch and resolves their futures."""
+        triples_of_requests = [request[0] for request in requests]
+        self._in_flight.acquire()
+        settled = threading.Lock()
+
+        def settle():
+            # the first of the results and the timeout settles the batch
+            if not settled.acquire(blocking=False):
+                return False
+            timer.cancel()
+            self._in_flight.release()
+            return True
+
+        def resolve(outcomes):
+            if settle():
+                for (_, _, future), (results, error) in zip(requests,
+                                                            outcomes):
+                    if error is None:
+                        future.set_result(results)
+                    else:
+                        future.set_exception(RuntimeError(error))
+
+        def fail(error):
+            if settle():
+                for _, _, future in requests:
+                    future.set_exception(error)
+
+        def time_out():
+            if self.pool is pool and pool is not None:
+                self._replace_pool()
+            fail(TimeoutError('batch not aligned in time'))
+
+        pool = self.pool
+        timer = threading.Timer(self.timeout, time_out)
+        timer.daemon = True
+        timer.start()
+        if pool is None:
+            resolve(_align_requests(triples_of_requests,
+                                    self.connector_matcher, options))
+        else:
+            pool.apply_async(_align_requests_in_worker,
+                                  (triples_of_requests, options),
+                                  callback=resolve, error_callback=fail)
+
+
+# connector matcher of a pool worker, set by _init_worker
+_worker_matcher = None
+
+def _init_worker(connector_matcher):
+    global _worker_matcher
+    _worker_matcher = connector_matcher
+
+def _align_requests_in_worker(triples_of_requests, options):
+    return _align_requests(triples_of_requests, _worker_matcher, options)
+
+def _align_requests(triples_of_requests, connector_matcher, options):
+    """
+    Returns (align_batch results, None) or (None, error message) for the
+    triples of every request.
+    """
+    outcomes = []
+    for triples in triples_of_requests:
+        try:
+            outcomes.append((align_batch(triples, connector_matcher, *options),
+                             None))
+        except Exception as error:
+            outcomes.append((None, f'{type(error).__name__}: {error}'))
+    return outcomes
+
+
+class AlignmentRequestHandler(BaseHTTPRequestHandler):
+    """JSON endpoints of an AlignmentService (set as server.service)."""
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path != '/align':
+            self._send_json(404, {'error': 'not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length))
+            if 'ids' in request:
+                triples = self._corpus_triples(request['ids'])
+            else:
+                triples = [parallel_sent_type(triple)(**triple)
+                           for triple in request['triples']]
+                for triple in triples:
+                    for lang, sent in triple._asdict().items():
+                        if not isinstance(sent, str):
+                            raise TypeError(f'the {lang} sentence is not a '
+                                            f'string')
+            if len({triple._fields for triple in triples}) > 1:
+                raise ValueError('all triples need the same languages')
+            for lang in triples[0]._fields if triples else ():
+                self.server.service.connector_matcher.matcher_for(lang)
+            alignment = request.get('alignment', 'greedy')
+            if alignment not in ALIGNMENT_METHODS:
+                raise ValueError(f'unknown alignment method {alignment}')
+            html = bool(request.get('html', False))
+        except (ValueError, KeyError, TypeError) as error:
+            self._send_json(400, {'error': f'{type(error).__name__}: {error}'})
+            return
+        try:
+            future = self.server.service.submit(triples, alignment, html)
+        except queue.Full:
+            self._send_json(503, {'error': 'too many pending requests'})
+            return
+        try:
+            # the service fails batches after its timeout, the margin only
+            # guards against a stuck batcher
+            results = future.result(timeout=self.server.service.timeout + 5)
+        except (TimeoutError, FutureTimeoutError) as error:
+            self._send_json(504, {'error': str(error)
+                                  or 'alignment timed out'})
+            return
+        except Exception as error:
+            self._send_json(500, {'error': str(error)})
+            return
+        self._send_json(200, {'results': results})
+
+    def _corpus_triples(self, ids):
+        corpus = self.server.service.corpus
+        if corpus is None:
+            raise ValueError('no corpus loaded, start the server with --corpus')
+        for i in ids:
+            if not isinstance(i, int) or not 0 <= i < len(corpus):
+                raise ValueError(f'no triple {i} in the corpus')
+        return [corpus.triple(i) for i in ids]
+
+    def log_message(self, format, *args):
+        pass  # no log line per request
+
+    def _send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class AlignmentServer(ThreadingHTTPServer):
+    # backlog of connections, the default of 5 drops bursts of clients
+    request_queue_size = 128
+
+
+def serve(host='127.0.0.1', port=8765, workers=2, max_batch=64,
+          max_wait=0.005, max_pending=1024, langs=LANGS, corpus_dir=None,
+          timeout=30.0):
+    """
+    Loads the lexicon (and a binary corpus) once and serves alignment
+    requests until interrupted.
+    """
+    corpus = BinaryCorpus.load(corpus_dir) if corpus_dir else None
+    if corpus is not None:
+        langs = corpus.langs
+    service = AlignmentService(load_language_matchers(langs), workers,
+                               max_batch, max_wait, max_pending, corpus,
+                               timeout)
+    server = AlignmentServer((host, port), AlignmentRequestHandler)
+    server.service = service
+    print(f'serving on http://{host}:{server.server_port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2,
+                        help='worker processes (0: align in the server process)')
+    parser.add_argument('--max-batch', type=int, default=64,
+                        help='maximum number of triples per batch')
+    parser.add_argument('--max-wait', type=float, default=0.005,
+                        help='seconds to wait for more requests for a batch')
+    parser.add_argument('--max-pending', type=int, default=1024,
+                        help='maximum number of requests waiting for a batch')
+    parser.add_argument('--langs', nargs='+', default=list(LANGS),
+                        help='languages of the connector lists to load')
+    parser.add_argument('--corpus', metavar='DIR',
+                        help='pre-tokenized corpus (see binary_corpus.py) '
+                             'whose triples can be aligned by index')
+    parser.add_argument('--timeout', type=float, default=30.0,
+                        help='seconds after which a request fails with 504')
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.max_batch, args.max_wait,
+          args.max_pending, args.langs, args.corpus, args.timeout)
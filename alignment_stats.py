@@ -0,0 +1,180 @@
+"""Integer-coded alignment groups, reduced in bulk into pair, relation and confusion tables."""
+import csv
+import os
+from array import array
+from itertools import combinations
+import numpy as np
+
+
+class AlignmentStats:
+    """
+    One row per aligned group (connectors of one color in a triple): for
+    every language the code of its connector and of the set of its
+    relations, 0 where the group has no connector in that language.
+    Stats of chunks are merged by remapping their codes and reduced with
+    numpy when written.
+    """
+
+    def __init__(self, langs):
+        self.langs = tuple(langs)
+        # connector -> code and relation set -> code, 0 for no connector
+        self.connectors = {'': 0}
+        self.relation_sets = {frozenset(): 0}
+        # per language: connector codes and relation set codes of all groups
+        self.columns = [(array('i'), array('i')) for _ in self.langs]
+
+    def __len__(self):
+        return len(self.columns[0][0]) if self.columns else 0
+
+    def add(self, extracted_connectors, aligned_connectors):
+        """Adds the aligned groups of a triple."""
+        groups = dict()  # color -> [connector code, relation set code] per lang
+        for position, lang in enumerate(self.langs):
+            for tokens, indices, relations in extracted_connectors[lang]:
+                color = aligned_connectors[lang].get(indices[0])
+                row = groups.get(color)
+                if row is None:
+                    row = groups[color] = [0] * (2 * len(self.langs))
+                connector = ' '.join(tokens).lower()
+                row[2 * position] = self.connectors.setdefault(
+                    connector, len(self.connectors))
+                relation_set = frozenset(relations)
+                row[2 * position + 1] = self.relation_sets.setdefault(
+                    relation_set, len(self.relation_sets))
+        for row in groups.values():
+            for position, (connector_codes, relation_codes) in enumerate(
+                    self.columns):
+                connector_codes.append(row[2 * position])
+                relation_codes.append(row[2 * position + 1])
+
+    def merge(self, other):
+        """Appends the groups of other AlignmentStats (of the same languages)."""
+        if other is None or not len(other):
+            return
+        if other.langs != self.langs:
+            raise ValueError(f'cannot merge stats of {other.langs} into '
+                             f'{self.langs}')
+        connector_map = _code_map(self.connectors, other.connectors)
+        relation_map = _code_map(self.relation_sets, other.relation_sets)
+        for (connector_codes, relation_codes), (other_connectors,
+                                                other_relations) in zip(
+                self.columns, other.columns):
+            connector_codes.frombytes(connector_map[
+                np.frombuffer(other_connectors, dtype=np.int32)].tobytes())
+            relation_codes.frombytes(relation_map[
+                np.frombuffer(other_relations, dtype=np.int32)].tobytes())
+
+    def pair_counts(self, lang_a, lang_b):
+        """
+        Returns [(connector in lang_a, connector in lang_b, count)] of all
+        groups, most frequent first, then by connectors ('' where a group
+        has no connector in a language).
+        """
+        a = self._codes(lang_a)
+        b = self._codes(lang_b)
+        size = len(self.connectors)
+        pairs, counts = np.unique(a.astype(np.int64) * size + b,
+                                  return_counts=True)
+        names = np.array(list(self.connectors), dtype=object)
+        # rank of every connector code in alphabetical order, for ties
+        rank = np.empty(size, dtype=np.int64)
+        rank[np.argsort(names.astype(str), kind='stable')] = np.arange(size)
+        order = np.lexsort((rank[pairs % size], rank[pairs // size], -counts))
+        return list(zip(names[pairs[order] // size].tolist(),
+                        names[pairs[order] % size].tolist(),
+                        counts[order].tolist()))
+
+    def relation_agreement(self, lang_a, lang_b):
+        """
+        Returns [(relation, groups with it in lang_a, in lang_b, in both,
+        agreement)] where agreement is both / groups with it in either.
+        """
+        relations, matrix = self._relation_matrix(lambda relation: relation)
+        set_a, set_b, counts = self._relation_set_pairs(lang_a, lang_b)
+        in_a = matrix[set_a]
+        in_b = matrix[set_b]
+        both = counts @ (in_a & in_b)
+        either = counts @ (in_a | in_b)
+        return [(relation, int(a), int(b), int(n), n / total if total else 0.0)
+                for relation, a, b, n, total in zip(
+                    relations, counts @ in_a, counts @ in_b, both, either)]
+
+    def confusion_matrix(self, lang_a, lang_b):
+        """
+        Returns the top-level relation classes and a matrix counting, for
+        every group with connectors in both languages, each combination of
+        a class of the connector in lang_a (rows) and in lang_b (columns).
+        """
+        classes, matrix = self._relation_matrix(
+            lambda relation: relation.split('.')[0])
+        set_a, set_b, counts = self._relation_set_pairs(lang_a, lang_b)
+        return classes, (matrix[set_a] * counts[:, None]).T @ matrix[set_b]
+
+    def write(self, dir_out='output'):
+        """
+        Writes for every pair of languages the connector pair counts to
+        {a}_{b}_stat.csv, the relation agreement to
+        {a}_{b}_relation_agreement.csv and the confusion matrix of relation
+        classes to {a}_{b}_confusion.csv.
+        """
+        for lang_a, lang_b in combinations(self.langs, 2):
+            prefix = os.path.join(dir_out, f'{lang_a}_{lang_b}')
+            _write_csv(f'{prefix}_stat.csv', [lang_a, lang_b, 'count'],
+                       self.pair_counts(lang_a, lang_b))
+            _write_csv(f'{prefix}_relation_agreement.csv',
+                       ['relation', lang_a, lang_b, 'both', 'agreement'],
+                       ((relation, a, b, both, f'{agreement:.4f}')
+                        for relation, a, b, both, agreement
+                        in self.relation_agreement(lang_a, lang_b)))
+            classes, matrix = self.confusion_matrix(lang_a, lang_b)
+            _write_csv(f'{prefix}_confusion.csv',
+                       [f'{lang_a}\\{lang_b}'] + classes,
+                       ([relation_class] + row for relation_class, row
+                        in zip(classes, matrix.tolist())))
+
+    def _codes(self, lang):
+        return np.frombuffer(self.columns[self.langs.index(lang)][0],
+                             dtype=np.int32)
+
+    def _relation_codes(self, lang):
+        return np.frombuffer(self.columns[self.langs.index(lang)][1],
+                             dtype=np.int32)
+
+    def _relation_set_pairs(self, lang_a, lang_b):
+        """
+        Returns the distinct pairs of relation set codes of the groups in
+        lang_a and lang_b and their counts, so that the relation tables are
+        computed per pair instead of per group.
+        """
+        size = len(self.relation_sets)
+        pairs, counts = np.unique(
+            self._relation_codes(lang_a).astype(np.int64) * size
+            + self._relation_codes(lang_b), return_counts=True)
+        return pairs // size, pairs % size, counts
+
+    def _relation_matrix(self, label):
+        """
+        Returns the sorted labels of all relations and a 0/1 matrix
+        (relation set code x label) of the labels in every relation set.
+        """
+        labels = sorted({label(relation) for relation_set in self.relation_sets
+                         for relation in relation_set})
+        column = {value: i for i, value in enumerate(labels)}
+        matrix = np.zeros((len(self.relation_sets), len(labels)), dtype=np.int64)
+        for code, relation_set in enumerate(self.relation_sets):
+            for relation in relation_set:
+                matrix[code, column[label(relation)]] = 1
+        return labels, matrix
+
+
+def _code_map(vocab, other_vocab):
+    """Returns an array mapping the codes of other_vocab to codes of vocab."""
+    return np.array([vocab.setdefault(value, len(vocab))
+                     for value in other_vocab], dtype=np.int32)
+
+
+def _write_csv(path_out, header, rows):
+    with open(path_out, 'w', encoding='utf-8', newline='') as f_out:
+        writer = csv.writer(f_out)
+        writer.writerow(header)
+        writer.writerows(rows)
@@ -0,0 +1,58 @@
+"""Maximum-weight bipartite matching (Hungarian algorithm) for connector alignment."""
+
+
+def max_weight_assignment(weights):
+    """
+    Returns the (row, column) pairs of an assignment with maximum total weight
+    for a (possibly rectangular) weight matrix given as list of rows. Every row
+    or every column (whichever are fewer) is assigned exactly once.
+    Runs in O(n^2 m) for n rows and m columns, n <= m.
+    """
+    if not weights or not weights[0]:
+        return []
+    if len(weights) > len(weights[0]):
+        transposed = [list(column) for column in zip(*weights)]
+        return sorted((row, col) for col, row
+                      in max_weight_assignment(transposed))
+
+    n, m = len(weights), len(weights[0])
+    inf = float('inf')
+    # potentials of rows (u) and columns (v), 1-based with a dummy column 0
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    row_of_col = [0] * (m + 1)
+    way = [0] * (m + 1)
+    for row in range(1, n + 1):
+        row_of_col[0] = row
+        col0 = 0
+        min_slack = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[col0] = True
+            row0 = row_of_col[col0]
+            delta, col1 = inf, 0
+            for col in range(1, m + 1):
+                if not used[col]:
+                    # minimize the negated weights
+                    slack = -weights[row0 - 1][col - 1] - u[row0] - v[col]
+                    if slack < min_slack[col]:
+                        min_slack[col] = slack
+                        way[col] = col0
+                    if min_slack[col] < delta:
+                        delta, col1 = min_slack[col], col
+            for col in range(m + 1):
+                if used[col]:
+                    u[row_of_col[col]] += delta
+                    v[col] -= delta
+                else:
+                    min_slack[col] -= delta
+            col0 = col1
+            if row_of_col[col0] == 0:
+                break
+        # augment along the alternating path
+        while col0:
+            col1 = way[col0]
+            row_of_col[col0] = row_of_col[col1]
+            col0 = col1
+    return sorted((row_of_col[col] - 1, col - 1) for col in range(1, m + 1)
+                  if row_of_col[col])
@@ -0,0 +1,380 @@
+"""
+Benchmarks of the connector pipeline on the bundled data, scaled up synthetically.
+
+Every stage (xml parsing, lexicon load, tokenization, extraction, alignment,
+rendering, stats and I/O) is timed separately, and the cost of adding
+languages is measured on parallel corpora with the languages replicated.
+Results are printed and saved as json, so that runs of different versions
+can be compared:
+
+    python3 benchmark.py --scales 1 10 100 --output bench_new.json
+    python3 benchmark.py --compare bench_old.json bench_new.json
+"""
+import argparse
+import copy
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from alignment_stats import AlignmentStats
+from binary_corpus import BinaryCorpus, convert_corpus
+from connector_matcher import ConnectorMatcher, LanguageMatchers
+from corpus_reader import (LANGS, iter_sent_triples, parallel_sent_type,
+                           tokenize_triple)
+from corpus_to_html import (align_connectors, extract_connectors,
+                            sent_to_html_str)
+from extract_connectors import build_connector_df
+from lexicon import (CONNECTOR_CSVS, load_connector_matcher,
+                     load_language_matchers, merge_connector_lists,
+                     read_connector_list)
+
+CORPUS_ROOT = os.path.join('data', 'corpus')
+LEXICONS = {
+    'dimlex': 'data/connectors_xml/en_dimlex.xml',
+    'conano': 'data/connectors_xml/ConAnoConnectorLexicon.xml',
+    'lico': 'data/connectors_xml/LICO-v.1.0.xml',
+}
+SCALES = [1, 10]
+LANG_COUNTS = [3, 6, 12]
+STATS_TRIPLES = [10 ** 5, 10 ** 6]
+# document aligned by bench_startup (with the regex tokenizer, importing nltk
+# alone takes about 0.3 s) and the default budget of its median seconds,
+# including the interpreter start
+STARTUP_DOCUMENT = 'micro_b001'
+STARTUP_BUDGET = 0.25
+
+
+def bench_lexicon_build(scales=SCALES):
+    """
+    Times build_connector_df on each lexicon, repeated scale times to mimic
+    larger (or merged) connective-lex dumps. Returns a list of result dicts.
+    """
+    results = []
+    for lexicon_format, xml_filepath in LEXICONS.items():
+        root = ET.parse(xml_filepath).getroot()
+        for scale in scales:
+            scaled_root = _scale_xml_root(root, scale)
+            start = time.perf_counter()
+            df = build_connector_df(scaled_root, lexicon_format)
+            seconds = time.perf_counter() - start
+            results.append({'lexicon': lexicon_format, 'scale': scale,
+                            'rows': len(df), 'seconds': seconds,
+                            'rows_per_second': len(df) / seconds})
+    return results
+
+
+def bench_lexicon_load():
+    """Times reading and compiling the connector lists, cold and cached."""
+    timings = {}
+    connector_lists = _timed(timings, 'read_connector_list', lambda: [
+        read_connector_list(csv_filepath) for csv_filepath in CONNECTOR_CSVS])
+    _timed(timings, 'compile', lambda: ConnectorMatcher(
+        merge_connector_lists(connector_lists)))
+    _timed(timings, 'compile_by_language', lambda: LanguageMatchers(
+        dict(zip(['de', 'en', 'it'], connector_lists))))
+    load_language_matchers()  # make sure the cache is up to date
+    _timed(timings, 'cached_load', load_language_matchers)
+    return timings
+
+
+def bench_pipeline(scales=SCALES, tokenizer='nltk', alignment='greedy'):
+    """
+    Times every stage of the pipeline on the corpus repeated scale times.
+    Returns a list of result dicts with seconds and triples/s per stage.
+    Every scale runs in a fresh process, so that its peak rss is its own.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context
+    results = []
+    for scale in scales:
+        # spawned instead of forked, a forked child inherits the peak rss
+        with ProcessPoolExecutor(1, mp_context=get_context('spawn')) as pool:
+            results.append(pool.submit(_bench_scale, scale, tokenizer,
+                                       alignment).result())
+    return results
+
+
+def _bench_scale(scale, tokenizer, alignment):
+    """Times every stage of the pipeline at one scale, see bench_pipeline."""
+    connector_matcher = load_language_matchers()
+    timings = {}
+    triples = _timed(timings, 'xml_parsing', lambda: [
+        triple for _ in range(scale)
+        for triple in iter_sent_triples(CORPUS_ROOT)])
+    tokenized = _timed(timings, 'tokenization', lambda: [
+        tokenize_triple(triple, tokenizer) for triple in triples])
+    extracted = _timed(timings, 'extract_connectors', lambda: [
+        extract_connectors(triple, connector_matcher)
+        for triple in tokenized])
+    aligned = _timed(timings, 'align_connectors', lambda: [
+        align_connectors(connectors, alignment) for connectors in extracted])
+    html = _timed(timings, 'sent_to_html_str', lambda: [
+        sent_to_html_str(sent, aligned_connectors, lang)
+        for triple, aligned_connectors in zip(tokenized, aligned)
+        for lang, sent in triple._asdict().items()])
+    stats = AlignmentStats(LANGS)
+    _timed(timings, 'stats', lambda: [
+        stats.add(connectors, aligned_connectors)
+        for connectors, aligned_connectors in zip(extracted, aligned)])
+    _timed(timings, 'io', lambda: _write_temporary(html))
+    with tempfile.TemporaryDirectory() as dir_out:
+        _timed(timings, 'stats_write', lambda: stats.write(dir_out))
+
+    return {
+        'scale': scale,
+        'triples': len(triples),
+        'stages': {stage: {'seconds': seconds,
+                           'triples_per_second': len(triples) / seconds}
+                   for stage, seconds in timings.items()},
+        'total_seconds': sum(timings.values()),
+        'triples_per_second': len(triples) / sum(timings.values()),
+        'peak_rss_kb': _peak_rss_kb(),
+        }
+
+
+def bench_languages(lang_counts=LANG_COUNTS, tokenizer='nltk',
+                    alignment='greedy'):
+    """
+    Times extraction, alignment and stats of the corpus with de, en and it
+    replicated to lang_counts languages (e.g. de, en, it, de_1, en_1, ...).
+    The seconds per language should stay about constant.
+    """
+    # replicated languages have no connector lists of their own, so all
+    # sentences are matched against the merged lists
+    connector_matcher = load_connector_matcher()
+    tokenized = [tokenize_triple(triple, tokenizer)
+                 for triple in iter_sent_triples(CORPUS_ROOT)]
+    results = []
+    for lang_count in lang_counts:
+        langs = [LANGS[i % 3] + (f'_{i // 3}' if i >= 3 else '')
+                 for i in range(lang_count)]
+        sent_type = parallel_sent_type(langs, tokenized=True)
+        triples = [sent_type(*(triple[i % 3] for i in range(lang_count)))
+                   for triple in tokenized]
+        timings = {}
+        extracted = _timed(timings, 'extract_connectors', lambda: [
+            extract_connectors(triple, connector_matcher) for triple in triples])
+        aligned = _timed(timings, 'align_connectors', lambda: [
+            align_connectors(connectors, alignment) for connectors in extracted])
+        stats = AlignmentStats(langs)
+        _timed(timings, 'stats', lambda: [
+            stats.add(connectors, aligned_connectors)
+            for connectors, aligned_connectors in zip(extracted, aligned)])
+        results.append({'languages': lang_count, 'triples': len(triples),
+                        'stages': timings,
+                        'seconds_per_language': sum(timings.values())
+                                                / lang_count})
+    return results
+
+
+def bench_stats(triple_counts=STATS_TRIPLES, tokenizer='nltk',
+                alignment='greedy'):
+    """
+    Times merging the AlignmentStats of the corpus, replicated to about
+    triple_counts triples as if they came from many chunks, and reducing and
+    writing the merged stats.
+    """
+    connector_matcher = load_language_matchers()
+    chunk_stats = AlignmentStats(LANGS)
+    triples = 0
+    for triple in iter_sent_triples(CORPUS_ROOT):
+        extracted_connectors = extract_connectors(
+            tokenize_triple(triple, tokenizer), connector_matcher)
+        chunk_stats.add(extracted_connectors,
+                        align_connectors(extracted_connectors, alignment))
+        triples += 1
+    results = []
+    for triple_count in triple_counts:
+        chunks = max(triple_count // triples, 1)
+        timings = {}
+        stats = AlignmentStats(LANGS)
+        _timed(timings, 'merge', lambda: [
+            stats.merge(chunk_stats) for _ in range(chunks)])
+        with tempfile.TemporaryDirectory() as dir_out:
+            _timed(timings, 'write', lambda: stats.write(dir_out))
+        results.append({'triples': chunks * triples, 'groups': len(stats),
+                        'stages': timings})
+    return results
+
+
+def bench_binary_corpus(tokenizer='nltk', samples=1000):
+    """
+    Times reading the tokenized corpus from the xml files against converting
+    it once to a binary_corpus and reading it memory-mapped, in whole and
+    by random access to samples triples.
+    """
+    timings = {}
+    _timed(timings, 'xml_parsing_and_tokenization', lambda: [
+        tokenize_triple(triple, tokenizer)
+        for triple in iter_sent_triples(CORPUS_ROOT)])
+    with tempfile.TemporaryDirectory() as dir_out:
+        _timed(timings, 'convert', lambda: convert_corpus(
+            CORPUS_ROOT, dir_out, tokenizer=tokenizer))
+        corpus = _timed(timings, 'load', lambda: BinaryCorpus.load(dir_out))
+        _timed(timings, 'read_all', lambda: list(corpus))
+        ids = random.Random(0).choices(range(len(corpus)), k=samples)
+        _timed(timings, f'random_access_{samples}', lambda: [
+            corpus.triple(i) for i in ids])
+    return timings
+
+
+def bench_startup(document=STARTUP_DOCUMENT, tokenizer='regex', runs=5):
+    """
+    Times `cli.py align` on one document in fresh interpreters, i.e. imports,
+    lexicon load and alignment as a user waits for them. Returns the seconds
+    of all runs and their median.
+    """
+    command = [sys.executable, os.path.join(os.path.dirname(__file__) or '.',
+                                            'cli.py'),
+               'align', document, '--tokenizer', tokenizer]
+    seconds = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        seconds.append(time.perf_counter() - start)
+    return {'document': document, 'tokenizer': tokenizer, 'runs': seconds,
+            'median': statistics.median(seconds)}
+
+
+def compare(old_filepath, new_filepath):
+    """Prints the per-stage speedups (old / new seconds) of two result files."""
+    with open(old_filepath, encoding='utf-8') as f_old, \
+            open(new_filepath, encoding='utf-8') as f_new:
+        old, new = json.load(f_old), json.load(f_new)
+    print(f"{old['version']} -> {new['version']}")
+    old_runs = {run['scale']: run for run in old['pipeline']}
+    for run in new['pipeline']:
+        if run['scale'] not in old_runs:
+            continue
+        for stage, timing in run['stages'].items():
+            old_timing = old_runs[run['scale']]['stages'].get(stage)
+            if old_timing:
+                print(f"x{run['scale']:<5} {stage:<20} "
+                      f"{old_timing['seconds'] / timing['seconds']:6.2f}x")
+
+
+def _peak_rss_kb():
+    """Returns the peak resident set size of this process in kB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kB on Linux
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def _timed(timings, stage, func):
+    """Calls func, records its duration under stage and returns its result."""
+    start = time.perf_counter()
+    result = func()
+    timings[stage] = time.perf_counter() - start
+    return result
+
+
+def _write_temporary(chunks):
+    with tempfile.TemporaryFile(mode='w', encoding='utf-8') as f_out:
+        f_out.writelines(chunks)
+
+
+def _scale_xml_root(root, scale):
+    """Returns a copy of a lexicon root with all entries repeated scale times."""
+    scaled_root = ET.Element(root.tag, root.attrib)
+    for _ in range(scale):
+        scaled_root.extend(copy.deepcopy(entry) for entry in root.iter('entry'))
+    return scaled_root
+
+
+def _version():
+    """Returns the current git commit, or 'unknown' outside a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main(argv=None, prog=None):
+    """Runs the benchmarks with the command line options in argv."""
+    parser = argparse.ArgumentParser(prog=prog,
+                                     description=__doc__.split('\n')[1])
+    parser.add_argument('--scales', type=int, nargs='+', default=SCALES,
+                        help='corpus and lexicon size factors (e.g. 1 10 1000)')
+    parser.add_argument('--langs', type=int, nargs='+', default=LANG_COUNTS,
+                        help='numbers of (replicated) languages, e.g. 3 6 12')
+    parser.add_argument('--stats-triples', type=int, nargs='+',
+                        default=STATS_TRIPLES,
+                        help='numbers of triples to merge and write stats of')
+    parser.add_argument('--tokenizer', default='nltk')
+    parser.add_argument('--alignment', default='greedy')
+    parser.add_argument('--output', default=os.path.join('output',
+                                                         'benchmark.json'))
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare two result files instead of running')
+    parser.add_argument('--startup-budget', type=float, metavar='SECONDS',
+                        nargs='?', const=STARTUP_BUDGET,
+                        help='only check that `cli.py align` on one document '
+                             'takes at most SECONDS (median, default '
+                             f'{STARTUP_BUDGET}), exit with 1 otherwise')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+    elif args.startup_budget is not None:
+        startup = bench_startup()
+        print(f"align {startup['document']}: {startup['median']:.3f} s "
+              f"(budget {args.startup_budget:.3f} s)")
+        if startup['median'] > args.startup_budget:
+            sys.exit(1)
+    else:
+        report = {'version': _version(),
+                  'python': platform.python_version(),
+                  'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                  'tokenizer': args.tokenizer,
+                  'alignment': args.alignment,
+                  'lexicon_build': bench_lexicon_build(args.scales),
+                  'lexicon_load': bench_lexicon_load(),
+                  'pipeline': bench_pipeline(args.scales, args.tokenizer,
+                                             args.alignment),
+                  'languages': bench_languages(args.langs, args.tokenizer,
+                                               args.alignment),
+                  'stats': bench_stats(args.stats_triples, args.tokenizer,
+                                       args.alignment),
+                  'binary_corpus': bench_binary_corpus(args.tokenizer),
+                  'startup': bench_startup()}
+        for result in report['lexicon_build']:
+            print('{lexicon:>6} x{scale:<5} {rows:>8} rows {seconds:8.3f} s '
+                  '{rows_per_second:>10.0f} rows/s'.format(**result))
+        for step, seconds in report['lexicon_load'].items():
+            print(f'lexicon {step:<20} {seconds:8.3f} s')
+        for run in report['pipeline']:
+            for stage, timing in run['stages'].items():
+                print(f"x{run['scale']:<5} {stage:<20} "
+                      f"{timing['seconds']:8.3f} s "
+                      f"{timing['triples_per_second']:>10.0f} triples/s")
+            print(f"x{run['scale']:<5} {'total':<20} "
+                  f"{run['total_seconds']:8.3f} s "
+                  f"{run['triples_per_second']:>10.0f} triples/s, "
+                  f"peak rss {run['peak_rss_kb'] // 1024} MB")
+        for run in report['stats']:
+            print(f"stats {run['triples']:>9} triples {run['groups']:>9} groups "
+                  + ' '.join(f'{stage} {seconds:.3f} s'
+                             for stage, seconds in run['stages'].items()))
+        for step, seconds in report['binary_corpus'].items():
+            print(f'corpus {step:<30} {seconds:8.3f} s')
+        print(f"startup align {report['startup']['document']} "
+              f"{report['startup']['median']:8.3f} s")
+        for run in report['languages']:
+            print(f"{run['languages']:>3} languages "
+                  f"{sum(run['stages'].values()):8.3f} s "
+                  f"{run['seconds_per_language']:8.3f} s/language")
+        with open(args.output, 'w', encoding='utf-8') as f_out:
+            json.dump(report, f_out, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""
+Pre-tokenized binary corpus: token ids in a shared vocabulary in flat numpy
+arrays with offset tables, read by memory-mapping instead of parsing xml.
+
+    python3 binary_corpus.py data/corpus output/corpus_bin --tokenizer regex
+"""
+import argparse
+import json
+import os
+import numpy as np
+from corpus_reader import (LANGS, iter_sent_triples, parallel_sent_type,
+                           tokenize_triple)
+from tokenizer import TokenizedSent
+
+# bump when the layout of the arrays changes
+FORMAT_VERSION = 1
+# flat arrays, sentences are stored triple by triple in the order of langs:
+# the tokens of sentence s are tokens[sent_offsets[s]:sent_offsets[s + 1]]
+# (spans are (start, end) character offsets into the text of the sentence),
+# its utf-8 text is text[text_offsets[s]:text_offsets[s + 1]] and the triples
+# of document d are doc_offsets[d]:doc_offsets[d + 1]
+ARRAYS = {
+    'tokens': np.int32,
+    'spans': np.int32,
+    'sent_offsets': np.int64,
+    'text': np.uint8,
+    'text_offsets': np.int64,
+    'doc_offsets': np.int64,
+}
+
+
+class BinaryCorpus:
+    """
+    Memory-mapped pre-tokenized corpus, written by convert_corpus. Triples
+    are TokenizedTriples (or parallel_sent_type classes for other languages)
+    with doc_id and edu_id, available by triple index or by document.
+    """
+
+    def __init__(self, arrays, vocab, meta, path=None):
+        # directory the corpus was loaded from, see CorpusSlice
+        self.path = path
+        self.arrays = arrays
+        self.vocab = vocab
+        self.langs = tuple(meta['langs'])
+        self.tokenizer = meta['tokenizer']
+        self.doc_ids = meta['doc_ids']
+        self.edu_ids = meta['edu_ids']
+        self._doc_index = {doc_id: i for i, doc_id in enumerate(self.doc_ids)}
+        self._triple_type = parallel_sent_type(self.langs, tokenized=True)
+        self._triple_docs = np.repeat(np.arange(len(self.doc_ids)),
+                                      np.diff(arrays['doc_offsets']))
+
+    @classmethod
+    def load(cls, dir_in, mmap_mode='r'):
+        """Loads a converted corpus, memory-mapping its arrays by default."""
+        arrays = {name: np.load(os.path.join(dir_in, f'{name}.npy'),
+                                mmap_mode=mmap_mode)
+                  for name in ARRAYS}
+        with open(os.path.join(dir_in, 'vocab.json'), encoding='utf-8') as f_in:
+            vocab = json.load(f_in)
+        with open(os.path.join(dir_in, 'meta.json'), encoding='utf-8') as f_in:
+            meta = json.load(f_in)
+        if meta.get('version') != FORMAT_VERSION:
+            raise ValueError(f'{dir_in} has format version {meta.get("version")}, '
+                             f'expected {FORMAT_VERSION}')
+        return cls(arrays, vocab, meta, dir_in)
+
+    def __len__(self):
+        return len(self.edu_ids)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.triple(i)
+
+    def triple(self, i):
+        """Returns the i-th triple of the corpus."""
+        first_sent = i * len(self.langs)
+        triple = self._triple_type(*(self._sent(first_sent + lang)
+                                     for lang in range(len(self.langs))))
+        triple.doc_id = self.doc_ids[self._triple_docs[i]]
+        triple.edu_id = self.edu_ids[i]
+        return triple
+
+    def document(self, doc_id):
+        """Returns all triples of a document."""
+        d = self._doc_index[doc_id]
+        offsets = self.arrays['doc_offsets']
+        return list(CorpusSlice(self, offsets[d], offsets[d + 1]))
+
+    def chunks(self, size):
+        """Yields CorpusSlices of at most size consecutive triples."""
+        for start in range(0, len(self), size):
+            yield CorpusSlice(self, start, min(start + size, len(self)))
+
+    def _sent(self, s):
+        arrays = self.arrays
+        start, end = arrays['sent_offsets'][s:s + 2]
+        text_start, text_end = arrays['text_offsets'][s:s + 2]
+        vocab = self.vocab
+        return TokenizedSent(
+            bytes(arrays['text'][text_start:text_end]).decode('utf-8'),
+            [vocab[token] for token in arrays['tokens'][start:end].tolist()],
+            [tuple(span) for span in arrays['spans'][start:end].tolist()])
+
+
+class CorpusSlice:
+    """
+    The triples start to stop of a BinaryCorpus. A slice of a loaded corpus
+    is pickled as its path and range only, so that worker processes read
+    the triples from their own memory map instead of receiving them.
+    """
+
+    def __init__(self, corpus, start, stop):
+        self.corpus = corpus
+        self.start = int(start)
+        self.stop = int(stop)
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __iter__(self):
+        for i in range(self.start, self.stop):
+            yield self.corpus.triple(i)
+
+    def __reduce__(self):
+        if self.corpus.path is None:
+            return (CorpusSlice, (self.corpus, self.start, self.stop))
+        return (_load_slice, (self.corpus.path, self.start, self.stop))
+
+
+# corpora loaded by _load_slice, by path
+_loaded_corpora = dict()
+
+def _load_slice(path, start, stop):
+    if path not in _loaded_corpora:
+        _loaded_corpora[path] = BinaryCorpus.load(path)
+    return CorpusSlice(_loaded_corpora[path], start, stop)
+
+
+def convert_corpus(corpus_root, dir_out, langs=LANGS, tokenizer='nltk',
+                   corpus_filepaths=None):
+    """
+    Tokenizes all triples of the xml corpus once and saves them in dir_out as
+    .npy arrays (see ARRAYS), the vocabulary as vocab.json and the languages,
+    tokenizer and document and edu ids as meta.json.
+    """
+    columns = {name: [] for name in ARRAYS}
+    for name in ['sent_offsets', 'text_offsets', 'doc_offsets']:
+        columns[name].append(0)
+    vocab = dict()
+    doc_ids = []
+    edu_ids = []
+    text = bytearray()
+    for triple in iter_sent_triples(corpus_root, corpus_filepaths, langs):
+        if not doc_ids or doc_ids[-1] != triple.doc_id:
+            if doc_ids:
+                columns['doc_offsets'].append(len(edu_ids))
+            doc_ids.append(triple.doc_id)
+        edu_ids.append(triple.edu_id)
+        for sent in tokenize_triple(triple, tokenizer):
+            columns['tokens'].extend(vocab.setdefault(token, len(vocab))
+                                     for token in sent.tokens)
+            columns['spans'].extend(sent.spans)
+            columns['sent_offsets'].append(len(columns['tokens']))
+            text += sent.text.encode('utf-8')
+            columns['text_offsets'].append(len(text))
+    columns['doc_offsets'].append(len(edu_ids))
+    columns['text'] = np.frombuffer(bytes(text), dtype=np.uint8)
+
+    os.makedirs(dir_out, exist_ok=True)
+    for name, dtype in ARRAYS.items():
+        array = np.asarray(columns[name], dtype=dtype)
+        if name == 'spans':
+            array = array.reshape(-1, 2)
+        np.save(os.path.join(dir_out, f'{name}.npy'), array)
+    with open(os.path.join(dir_out, 'vocab.json'), 'w',
+              encoding='utf-8') as f_out:
+        json.dump(list(vocab), f_out, ensure_ascii=False)
+    with open(os.path.join(dir_out, 'meta.json'), 'w',
+              encoding='utf-8') as f_out:
+        json.dump({'version': FORMAT_VERSION, 'langs': list(langs),
+                   'tokenizer': tokenizer, 'doc_ids': doc_ids,
+                   'edu_ids': edu_ids}, f_out, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('corpus_root')
+    parser.add_argument('dir_out')
+    parser.add_argument('--langs', nargs='+', default=list(LANGS))
+    parser.add_argument('--tokenizer', default='nltk')
+    args = parser.parse_args()
+    convert_corpus(args.corpus_root, args.dir_out, args.langs, args.tokenizer)
+
+    # check that the converted corpus reads back the same triples
+    corpus = BinaryCorpus.load(args.dir_out)
+    triples = iter_sent_triples(args.corpus_root, langs=args.langs)
+    mismatches = sum(
+        tuple(tokenize_triple(triple, args.tokenizer)) != tuple(converted)
+        or (triple.doc_id, triple.edu_id) != (converted.doc_id,
+                                              converted.edu_id)
+        for triple, converted in zip(triples, corpus))
+    print(f'{len(corpus)} triples of {len(corpus.doc_ids)} documents, '
+          f'{len(corpus.vocab)} token types, {mismatches} mismatches')
@@ -0,0 +1,131 @@
+"""
+Command line interface of the connector pipeline, one subcommand per task:
+
+    python3 cli.py build-lexicon [--force]
+    python3 cli.py align micro_b001 [--tokenizer regex] [--html]
+    python3 cli.py render [WORKERS] [ALIGNMENT] [--pages DIR] ...
+    python3 cli.py stats [--corpus DIR] [--output DIR]
+    python3 cli.py bench [--startup-budget SECONDS] ...
+
+`python3 cli.py COMMAND --help` lists the options of a command. Modules are
+only imported by the command that needs them, so that e.g. align starts
+without pandas, numpy and (with the regex tokenizer) nltk.
+"""
+import sys
+
+
+def build_lexicon(argv, prog):
+    """Builds the connector lists from the connective-lex xml lexicons."""
+    from extract_connectors import main
+    main(argv, prog)
+
+
+def align(argv, prog):
+    """Prints the aligned connectors of every triple of documents as json lines."""
+    import argparse
+    import json
+    from corpus_reader import LANGS, iter_sent_triples
+    from corpus_to_html import ALIGNMENT_METHODS, align_batch
+    from lexicon import load_language_matchers
+
+    parser = argparse.ArgumentParser(prog=prog, description=align.__doc__)
+    parser.add_argument('documents', nargs='*',
+                        help='documents (xml files of the corpus, e.g. '
+                             'micro_b001), all if none are given')
+    parser.add_argument('--corpus-root', default='data/corpus')
+    parser.add_argument('--langs', nargs='+', default=list(LANGS))
+    parser.add_argument('--alignment', default='greedy',
+                        choices=sorted(ALIGNMENT_METHODS))
+    parser.add_argument('--tokenizer', default='nltk')
+    parser.add_argument('--html', action='store_true',
+                        help='add the rendered html of every triple')
+    args = parser.parse_args(argv)
+
+    connector_matcher = load_language_matchers(args.langs)
+    documents = [document if document.endswith('.xml') else f'{document}.xml'
+                 for document in args.documents] or None
+    for triple in iter_sent_triples(args.corpus_root, documents, args.langs):
+        result, = align_batch([triple], connector_matcher, args.alignment,
+                              args.html, args.tokenizer)
+        print(json.dumps({'doc_id': triple.doc_id, 'edu_id': triple.edu_id,
+                          **result}, ensure_ascii=False))
+
+
+def render(argv, prog):
+    """Renders the corpus as html with color-coded connectors."""
+    from corpus_to_html import main
+    main(argv, prog)
+
+
+def stats(argv, prog):
+    """Writes the alignment statistics of the corpus without rendering it."""
+    import argparse
+    import os
+    from alignment_stats import AlignmentStats
+    from binary_corpus import BinaryCorpus
+    from corpus_reader import LANGS, iter_sent_triples, tokenize_triple
+    from corpus_to_html import (ALIGNMENT_METHODS, align_connectors,
+                                extract_connectors)
+    from lexicon import load_language_matchers
+
+    parser = argparse.ArgumentParser(prog=prog, description=stats.__doc__)
+    parser.add_argument('--corpus-root', default='data/corpus')
+    parser.add_argument('--corpus', metavar='DIR',
+                        help='read the pre-tokenized corpus converted to DIR '
+                             '(see binary_corpus.py) instead of the xml files')
+    parser.add_argument('--langs', nargs='+', default=list(LANGS))
+    parser.add_argument('--alignment', default='greedy',
+                        choices=sorted(ALIGNMENT_METHODS))
+    parser.add_argument('--tokenizer', default='nltk')
+    parser.add_argument('--output', metavar='DIR', default='output',
+                        help='directory of the csv files')
+    args = parser.parse_args(argv)
+
+    if args.corpus:
+        triples = BinaryCorpus.load(args.corpus)
+        langs = triples.langs
+    else:
+        langs = args.langs
+        triples = (tokenize_triple(triple, args.tokenizer) for triple
+                   in iter_sent_triples(args.corpus_root, langs=langs))
+    connector_matcher = load_language_matchers(langs)
+    alignment_stats = AlignmentStats(langs)
+    for triple in triples:
+        extracted_connectors = extract_connectors(triple, connector_matcher)
+        alignment_stats.add(extracted_connectors, align_connectors(
+            extracted_connectors, args.alignment))
+    os.makedirs(args.output, exist_ok=True)
+    alignment_stats.write(args.output)
+    print(f'{len(alignment_stats)} aligned groups, statistics written to '
+          f'{args.output}')
+
+
+def bench(argv, prog):
+    """Benchmarks the pipeline, or checks the startup time of align."""
+    from benchmark import main
+    main(argv, prog)
+
+
+COMMANDS = {
+    'build-lexicon': build_lexicon,
+    'align': align,
+    'render': render,
+    'stats': stats,
+    'bench': bench,
+}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in COMMANDS:
+        wants_help = bool(argv) and argv[0] in ('-h', '--help')
+        print(__doc__.strip() + '\n\ncommands:\n' + ''.join(
+            f'  {name:<14} {command.__doc__}\n'
+            for name, command in COMMANDS.items()),
+            file=sys.stdout if wants_help else sys.stderr)
+        sys.exit(0 if wants_help else 2)
+    COMMANDS[argv[0]](argv[1:], f'cli.py {argv[0]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+"""Compiled token trie for finding connectors in tokenized sentences."""
+import random
+import sys
+import time
+from bisect import bisect_left
+from itertools import chain
+
+# key under which a trie node stores the lexicon entries of a connector
+_ENTRIES = None
+
+
+class ConnectorMatcher:
+    """
+    Token-level trie over the single and double connectors of a connector
+    list (as returned by lexicon.read_connector_list). All connectors
+    of a sentence are found longest-first in one left-to-right pass.
+    """
+
+    def __init__(self, connector_list):
+        self.trie = dict()
+        # hash identifying the lexicon, see document_cache.lexicon_fingerprint
+        self.fingerprint = None
+        # one shared tuple of interned relations per distinct relation list
+        relation_tuples = dict()
+
+        def interned(relations):
+            relations = tuple(sys.intern(relation) for relation in relations)
+            return relation_tuples.setdefault(relations, relations)
+
+        for kind in ['single', 'double']:
+            for connector, values in connector_list[kind].items():
+                node = self.trie
+                for token in connector:
+                    node = node.setdefault(sys.intern(token), dict())
+                if kind == 'double':
+                    # counterparts as token tuples, looked up in the
+                    # sentence, longest first
+                    values = dict(values, counterparts=tuple(sorted(
+                        ((tuple(sys.intern(token)
+                                for token in counterpart.split(' ')),
+                          interned(relations))
+                         for counterpart, relations
+                         in values['counterparts'].items()),
+                        key=lambda item: (-len(item[0]), item[0]))))
+                else:
+                    values = dict(values, relation=interned(values['relation']))
+                node.setdefault(_ENTRIES, dict())[kind] = values
+
+    def matcher_for(self, lang):
+        """Returns the matcher for sentences in lang: the same for all."""
+        return self
+
+    def find_all(self, sent, metrics=None):
+        """
+        Returns all connectors of a tokenized sentence as a list of
+        (token list, index list, relation list) tuples, ordered by the
+        length of their (first) part, longest first, then by position (the
+        order alignment has always seen them in). The number of trie
+        and counterpart lookups is counted in metrics
+        (an instrumentation.Metrics), if given.
+        """
+        lowered = [token.lower() for token in sent]
+        # 1 for tokens already belonging to a connector
+        occupied = bytearray(len(lowered))
+        # positions of counterparts, built for the first double connector
+        counterparts = None
+        result = []
+        trie_lookups = 0
+        for i in range(len(lowered)):
+            if occupied[i]:
+                continue
+            candidates, lookups = self._candidates(lowered, i)
+            trie_lookups += lookups
+            for end, entries in candidates:
+                if any(occupied[i:end]):
+                    continue
+                if 'double' in entries and counterparts is None:
+                    counterparts = _CounterpartIndex(lowered)
+                connector = self._resolve(lowered, i, end, entries,
+                                          counterparts, occupied)
+                if connector:
+                    result.append((end - i, i, connector))
+                    for index in connector[1]:
+                        occupied[index] = 1
+                    break
+        if metrics is not None:
+            metrics.count('trie_lookups', trie_lookups)
+            if counterparts is not None:
+                metrics.count('counterpart_lookups', counterparts.lookups)
+        return _in_length_order(result)
+
+    def _candidates(self, lowered, start):
+        """
+        Returns (end index, entries) of all connectors at start, longest
+        first, and the number of trie lookups.
+        """
+        candidates = []
+        node = self.trie
+        for end in range(start, len(lowered)):
+            node = node.get(lowered[end])
+            if node is None:
+                break
+            if _ENTRIES in node:
+                candidates.append((end + 1, node[_ENTRIES]))
+        return reversed(candidates), end - start + 1
+
+    @staticmethod
+    def _resolve(lowered, start, end, entries, counterparts, occupied):
+        """
+        Returns the connector tuple for a lexicon hit lowered[start:end],
+        preferring a double connector whose counterpart occurs in the
+        sentence. Of several counterparts, the one found first (after the
+        hit, then from the beginning of the sentence) wins, the longest at
+        the same start.
+        """
+        if 'double' in entries:
+            found = None
+            for counterpart, relations in entries['double']['counterparts']:
+                counterpart_start = counterparts.find(counterpart, start, end,
+                                                      occupied)
+                if counterpart_start is not None and (
+                        found is None or (counterpart_start < start,
+                                          counterpart_start)
+                        < (found[1] < start, found[1])):
+                    found = (counterpart, counterpart_start, relations)
+            if found is not None:
+                counterpart, counterpart_start, relations = found
+                return (lowered[start:end] + list(counterpart),
+                        list(range(start, end))
+                        + list(range(counterpart_start,
+                                     counterpart_start + len(counterpart))),
+                        relations)
+        if 'single' in entries:
+            return (lowered[start:end], list(range(start, end)),
+                    entries['single']['relation'])
+        return None
+
+
+def _in_length_order(found):
+    """
+    Returns the connectors of (first part length, start, connector) triples,
+    longest first parts first and then by start.
+    """
+    found.sort(key=lambda item: (-item[0], item[1]))
+    return [connector for _, _, connector in found]
+
+
+class _CounterpartIndex:
+    """
+    Positional index of a lowercased sentence (token -> positions) for
+    finding counterparts of double connectors by lookup. Occupied tokens
+    stay occupied, so starts found occupied once are skipped for good.
+    """
+
+    def __init__(self, lowered):
+        self.lowered = lowered
+        self.positions = dict()
+        for position, token in enumerate(lowered):
+            self.positions.setdefault(token, []).append(position)
+        # counterpart -> (ascending starts, next candidate of every start)
+        self.starts = dict()
+        # number of starts looked at
+        self.lookups = 0
+
+    def find(self, counterpart, before, after, occupied):
+        """
+        Returns the first start from after on where counterpart occurs on
+        tokens that are not occupied, otherwise the first such start of an
+        occurrence ending before before, None if there is none.
+        """
+        if counterpart not in self.starts:
+            length = len(counterpart)
+            starts = [start for start
+                      in self.positions.get(counterpart[0], ())
+                      if tuple(self.lowered[start:start + length])
+                      == counterpart]
+            self.starts[counterpart] = (starts, list(range(len(starts) + 1)))
+        starts, next_candidate = self.starts[counterpart]
+        length = len(counterpart)
+        for first, stop in [(bisect_left(starts, after), len(starts)),
+                            (0, bisect_left(starts, before - length + 1))]:
+            k = _next_candidate(next_candidate, first)
+            while k < stop:
+                start = starts[k]
+                self.lookups += 1
+                if not any(occupied[start:start + length]):
+                    return start
+                next_candidate[k] = k + 1
+                k = _next_candidate(next_candidate, k + 1)
+        return None
+
+
+def _next_candidate(next_candidate, k):
+    """Follows and compresses the skip pointers from k to a usable candidate."""
+    root = k
+    while next_candidate[root] != root:
+        root = next_candidate[root]
+    while next_candidate[k] != root:
+        next_candidate[k], k = root, next_candidate[k]
+    return root
+
+
+class LanguageMatchers:
+    """
+    One ConnectorMatcher per language, compiled from {lang: connector list},
+    so that sentences are only matched against the lexicon of their language.
+    """
+
+    def __init__(self, connector_lists):
+        self.matchers = {lang: ConnectorMatcher(connector_list)
+                         for lang, connector_list in connector_lists.items()}
+        # hash identifying the lexicons, see document_cache.lexicon_fingerprint
+        self.fingerprint = None
+
+    @property
+    def trie(self):
+        return {lang: matcher.trie for lang, matcher in self.matchers.items()}
+
+    def matcher_for(self, lang):
+        """Returns the ConnectorMatcher of a language."""
+        try:
+            return self.matchers[lang]
+        except KeyError:
+            raise KeyError(f'no connector list for language {lang}') from None
+
+
+def _find_all_reference(sent, connector_list):
+    """
+    Brute-force version of ConnectorMatcher.find_all on an uncompiled
+    connector list: every connector length at every position, counterparts
+    by scanning the rest of the sentence, then its beginning.
+    """
+    lowered = [token.lower() for token in sent]
+    max_length = max(len(connector) for kind in ['single', 'double']
+                     for connector in connector_list[kind])
+    occupied = set()
+    result = []
+    for i in range(len(lowered)):
+        for length in range(min(max_length, len(lowered) - i), 0, -1):
+            connector = tuple(lowered[i:i + length])
+            if occupied.intersection(range(i, i + length)):
+                continue
+            found = None
+            double = connector_list['double'].get(connector)
+            if double:
+                for j in chain(range(i + length, len(lowered)), range(i)):
+                    # longest counterpart first, each ending before the
+                    # connector if it starts before it
+                    for counterpart, relations in sorted(
+                            double['counterparts'].items(),
+                            key=lambda item: -len(item[0].split(' '))):
+                        counterpart = tuple(counterpart.split(' '))
+                        indices = range(j, j + len(counterpart))
+                        if indices[-1] < (len(lowered) if j > i else i) \
+                                and tuple(lowered[j:j + len(counterpart)]) \
+                                == counterpart \
+                                and not occupied.intersection(indices):
+                            found = (list(connector) + list(counterpart),
+                                     list(range(i, i + length)) + list(indices),
+                                     tuple(relations))
+                            break
+                    if found:
+                        break
+            single = connector_list['single'].get(connector)
+            if found is None and single:
+                found = (list(connector), list(range(i, i + length)),
+                         tuple(single['relation']))
+            if found:
+                result.append((length, i, found))
+                occupied.update(found[1])
+                break
+    return _in_length_order(result)
+
+
+if __name__ == '__main__':
+    # property check against the brute-force reference on random sentences
+    # built from connector tokens, and timing on growing sentences
+    from lexicon import CONNECTOR_CSVS, merge_connector_lists, read_connector_list
+
+    connector_list = merge_connector_lists(
+        [read_connector_list(csv_filepath) for csv_filepath in CONNECTOR_CSVS]
+        + [{'single': {('but',): {'relation': ['comparison.contrast']}},
+            'double': {
+                ('not', 'only'): {'counterparts': {
+                    'but also': ['expansion.conjunction'],
+                    'but': ['comparison.contrast']}},
+                ('but', 'also'): {'counterparts': {
+                    'not only': ['expansion.conjunction']}},
+                }}])
+    matcher = ConnectorMatcher(connector_list)
+    # the same lexicon with the counterparts read in reverse order
+    reversed_matcher = ConnectorMatcher(dict(connector_list, double={
+        connector: dict(values, counterparts=dict(
+            reversed(values['counterparts'].items())))
+        for connector, values in connector_list['double'].items()}))
+    vocabulary = sorted({token for kind in ['single', 'double']
+                         for connector in connector_list[kind]
+                         for token in connector}) + ['x', 'y', ',', '.']
+    rng = random.Random(0)
+    for trial in range(5000):
+        sent = [rng.choice(vocabulary) for _ in range(rng.randrange(40))]
+        sent = [token.upper() if rng.random() < 0.1 else token
+                for token in sent]
+        found = [(tokens, indices, tuple(relations)) for tokens, indices,
+                 relations in matcher.find_all(sent)]
+        expected = _find_all_reference(sent, connector_list)
+        assert found == expected, (sent, found, expected)
+        assert reversed_matcher.find_all(sent) == matcher.find_all(sent), sent
+    print('5000 random sentences match the brute-force reference, whatever '
+          'the order of the counterparts')
+
+    first_parts = [list(connector) for connector in connector_list['double']]
+    for length in [1000, 10000, 100000]:
+        sent = []
+        while len(sent) < length:
+            sent += rng.choice(first_parts) + ['x'] * rng.randrange(5)
+        start = time.perf_counter()
+        matcher.find_all(sent)
+        seconds = time.perf_counter() - start
+        print(f'{len(sent):>7} tokens {seconds:8.3f} s '
+              f'{seconds / len(sent) * 1e6:6.2f} us/token')
@@ -1,11 +1,61 @@
-"""Corpus reader of the argumentative microtext corpus (in german, english and italian)."""
+"""
+Corpus reader of the argumentative microtext corpus (in german, english and
+italian by default, or any other set of parallel languages).
+"""
 import os
+import xml.etree.ElementTree as ET
 from collections import namedtuple
-from xml.dom import minidom
-from data.corpus import *
+from tokenizer import TokenizedSent, tokenize
+
+
+# define named tuple object for sentence triple, the corpus reader attaches
+# the ids of the document and the edu it comes from
+class SentTriple(namedtuple('SentTriple', 'de en it')):
+    doc_id = None
+    edu_id = None
+
+
+# sentence triple whose fields are tokenizer.TokenizedSent objects
+class TokenizedTriple(namedtuple('TokenizedTriple', 'de en it')):
+    doc_id = None
+    edu_id = None
+
+
+# default languages of the corpus
+LANGS = SentTriple._fields
+# named tuple classes for other sets of languages, see parallel_sent_type
+_PARALLEL_TYPES = dict()
+
+def parallel_sent_type(langs, tokenized=False):
+    """
+    Returns the named tuple class of parallel sentences with one field per
+    language: SentTriple (or TokenizedTriple) for de, en and it, otherwise a
+    class with the same doc_id and edu_id attributes, created once per set of
+    languages.
+    """
+    langs = tuple(langs)
+    if langs == LANGS:
+        return TokenizedTriple if tokenized else SentTriple
+    if (langs, tokenized) not in _PARALLEL_TYPES:
+        base = namedtuple('TokenizedSents' if tokenized else 'ParallelSents',
+                          langs)
+
+        class ParallelSents(base):
+            doc_id = None
+            edu_id = None
+
+            def __reduce__(self):
+                # the class is created at runtime, pickle how to recreate it
+                return (_make_parallel_sents, (self._fields, tokenized,
+                        tuple(self), self.doc_id, self.edu_id))
+
+        _PARALLEL_TYPES[(langs, tokenized)] = ParallelSents
+    return _PARALLEL_TYPES[(langs, tokenized)]
+
+def _make_parallel_sents(langs, tokenized, sents, doc_id, edu_id):
+    return _attach_ids(parallel_sent_type(langs, tokenized)(*sents),
+                       doc_id, edu_id)
 
-# define named tuple object for sentence triple
-SentTriple = namedtuple('SentTriple', 'de en it')
 
 def list_xml_files(corpus_root):
     """Returns xml filenames (without prefix) in the given corpus root directory."""
@@ -15,34 +65,57 @@ def list_xml_files(corpus_root):
         for filename in filenames if filename.endswith('.xml')
         ]
 
-def all_xmls_to_sent_triples(corpus_root, corpus_filepaths):
+def all_xmls_to_sent_triples(corpus_root, corpus_filepaths, langs=LANGS):
     """Returns a list of parallel sentence triples from all xml files."""
-    all_sent_triples = []
+    return list(iter_sent_triples(corpus_root, corpus_filepaths, langs))
+
+def iter_sent_triples(corpus_root, corpus_filepaths=None, langs=LANGS):
+    """
+    Yields the parallel sentences in langs (one sub-directory of corpus_root
+    each) of all xml files lazily, file by file. Without corpus_filepaths all
+    xml files of the corpus of the first language are read.
+    """
+    if corpus_filepaths is None:
+        corpus_filepaths = list_xml_files(os.path.join(corpus_root, langs[0]))
     for xml_filename in corpus_filepaths:
-        all_sent_triples.extend(
-            _xml_to_sent_triples(corpus_root, xml_filename)
-            )
-    return all_sent_triples
-
-def _xml_to_sent_triples(corpus_root, xml_filename):
-    """Returns a list of parallel sentence triples from a xml file."""
-    with open(os.path.join(corpus_root, 'de', xml_filename), 'r', encoding='utf-8') as f_de, \
-            open(os.path.join(corpus_root, 'en', xml_filename), 'r', encoding='utf-8') as f_en, \
-            open(os.path.join(corpus_root, 'it', xml_filename), 'r', encoding='utf-8') as f_it:
-
-        result = []
-        sents_de = minidom.parse(f_de).getElementsByTagName('edu')
-        sents_en = minidom.parse(f_en).getElementsByTagName('edu')
-        sents_it = minidom.parse(f_it).getElementsByTagName('edu')
-
-        for i in range(len(sents_de)):
-            result.append(SentTriple(
-                    sents_de[i].firstChild.nodeValue,
-                    sents_en[i].firstChild.nodeValue,
-                    sents_it[i].firstChild.nodeValue
-                ))
-
-        return result
+        yield from _xml_to_sent_triples(corpus_root, xml_filename, langs)
+
+def tokenize_triple(triple, backend='nltk'):
+    """
+    Tokenizes all sentences of a triple (or of parallel sentences in other
+    languages) once into a TokenizedTriple.
+    """
+    tokenized_type = parallel_sent_type(triple._fields, tokenized=True)
+    return _attach_ids(
+        tokenized_type(*(tokenize(sent, backend) for sent in triple)),
+        triple.doc_id, triple.edu_id
+        )
+
+def is_tokenized(triple):
+    """Returns whether the sentences of a triple are TokenizedSents."""
+    return all(isinstance(sent, TokenizedSent) for sent in triple)
+
+def _attach_ids(triple, doc_id, edu_id):
+    triple.doc_id = doc_id
+    triple.edu_id = edu_id
+    return triple
+
+def _xml_to_sent_triples(corpus_root, xml_filename, langs=LANGS):
+    """Yields the parallel sentences in langs of a xml file."""
+    sent_type = parallel_sent_type(langs)
+    doc_id = os.path.splitext(xml_filename)[0]
+    edus = zip(*(_iter_edus(os.path.join(corpus_root, lang, xml_filename))
+                 for lang in langs))
+    for parallel_edus in edus:
+        yield _attach_ids(sent_type(*(sent for _, sent in parallel_edus)),
+                          doc_id, parallel_edus[0][0])
+
+def _iter_edus(xml_filepath):
+    """Yields (id, text) of all edus in a xml file, freeing parsed elements."""
+    for _, element in ET.iterparse(xml_filepath):
+        if element.tag == 'edu':
+            yield element.get('id'), element.text
+        element.clear()
 
 
 if __name__ == "__main__":
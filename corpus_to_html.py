@@ -1,110 +1,89 @@
 """Read corpus into html file, with color-coded connectors"""
-import ast
-import csv
+import argparse
+import colorsys
 import os
-from collections import Counter
-from corpus_reader import *
-from nltk import ngrams
-from nltk.tokenize import word_tokenize
-
-
-def read_connector_list(txt_filepath):
-    """
-    Returns a dict of connectors read from a csv file.
-    Dict is structured into two dicts, one containing all single connectors,
-    the other containing the connectors with a counterpart.
-    """
-    result = {'single': {}, 'double': {}}
-    with open(txt_filepath, 'r', encoding='utf-8') as f_in:
-        reader = csv.DictReader(f_in)
-        for row in reader:
-            row['connector'] = tuple(row['connector'].split(' '))
-            # get the right types: list and boolean
-            row['relation'] = ast.literal_eval(row['relation'])
-            row['is_pair'] = ast.literal_eval(row['is_pair'])
-            row_values = {key: value for key, value in row.items()
-                          if key in ['relation', 'is_pair', 'counterpart']}
-            if row['is_pair']:
-                result['double'][row['connector']] = row_values
-            else:
-                result['single'][row['connector']] = row_values
-    return result
+import time
+from collections import Counter, deque, namedtuple
+from html import escape
+from itertools import chain, count, groupby, islice
+from urllib.parse import quote
+from assignment import max_weight_assignment
+from connector_matcher import ConnectorMatcher, LanguageMatchers
+from corpus_reader import (LANGS, is_tokenized, iter_sent_triples,
+                           list_xml_files, tokenize_triple)
+from document_cache import (CACHE_DIR, document_key, load_document_result,
+                            options_cache_dir, save_document_result)
+from instrumentation import Metrics
+from lexicon import load_language_matchers
+from tokenizer import TokenizedSent, tokenize
+
+
+# colors of aligned connectors, in order of use within a sentence triple
+COLORS = ['#FF2828', '#00c853', '#512da8', '#ff5722', '#4e342e', '#2962ff',
+          '#e91e63', '#26c6da', '#ffd600', '#9e9d24', '#004d40', '#455a64',
+          '#9C1717']
+# header of html pages in compact markup, with one css class per color
+PAGE_HEADER = '<meta charset="utf-8">\n<style>{}</style>\n'.format(''.join(
+    f'.c{i}{{color:{color}}}' for i, color in enumerate(COLORS)))
+_CSS_CLASSES = {color: f'c{i}' for i, color in enumerate(COLORS)}
 
-def extract_connectors(triple, connector_list):
-    """Extracts connectors as dict with their index and their relation(s)"""
-    connectors_in_triple = {key: list() for key in ['de', 'en', 'it']}
+def _spare_colors():
+    """
+    Yields further distinct colors for triples with more aligned groups than
+    COLORS (e.g. with many languages).
+    """
+    for i in count():
+        rgb = colorsys.hsv_to_rgb(i * 0.618034 % 1, 0.8, 0.7)
+        yield '#{:02x}{:02x}{:02x}'.format(*(round(c * 255) for c in rgb))
+
+def extract_connectors(triple, connector_list, metrics=None):
+    """
+    Extracts connectors as dict with their index and their relation(s).
+    triple is a SentTriple (or parallel sentences in other languages, see
+    corpus_reader.parallel_sent_type), possibly already tokenized,
+    connector_list is either a connector list as returned by
+    lexicon.read_connector_list, a compiled ConnectorMatcher (for all
+    languages) or LanguageMatchers (matching every sentence with the lexicon
+    of its language). With metrics (an instrumentation.Metrics) the lookups and
+    connectors per language are counted.
+    """
+    if not is_tokenized(triple):
+        triple = tokenize_triple(triple)
+    connector_list = _compiled(connector_list)
+    connectors_in_triple = {key: list() for key in triple._fields}
     for lang, sent in triple._asdict().items():
-        already_parsed = []  # remember indices of already seen connectors
-        sent = word_tokenize(sent)
-        # seach input in 4-grams, then 3-grams, then bi-grams, finally uni-grams
-        for n in range(4, 0, -1):
-            i = 0
-            for token in ngrams(sent, n):
-                if not i in already_parsed:
-                    token = tuple([word.lower() for word in token])
-
-                    # check if connector has a counterpart
-                    found_counterpart = False
-                    if token in connector_list['double'].keys():
-                        index_of_connector = [i]
-                        for index in range(1, n):
-                            index_of_connector += [i+index]
-                        counterpart = tuple(connector_list['double'][token]
-                                            ['counterpart'].split(' '))
-                        len_counterpart = len(counterpart)
-                        index = 0
-                        # search the sentence in ngrams of the length
-                        #    of the counterpart
-                        for part in ngrams(sent, len_counterpart):
-                            if part == counterpart:
-                                for i_counter in range(len_counterpart):
-                                    index_of_connector += [index+i_counter]
-                                connectors_in_triple[lang].append(
-                                     (list(token) + list(part),
-                                     index_of_connector,
-                                     connector_list['double'][token]['relation'])
-                                     )
-                                already_parsed += index_of_connector
-                                found_counterpart = True
-                                break
-                            else:
-                                index += len_counterpart
-
-                    # find single connectors
-                    if (token in connector_list['single'].keys()
-                       and not found_counterpart):
-                        index_of_connector = [i]
-                        # get indices of multiple worded connectors
-                        for index in range(1, n):
-                            index_of_connector += [i+index]
-                        connectors_in_triple[lang].append(
-                             (list(token),
-                             index_of_connector,
-                             connector_list['single'][token]['relation'])
-                             )
-                        already_parsed += index_of_connector
-                i += 1
+        connectors_in_triple[lang] = connector_list.matcher_for(lang).find_all(
+            sent.tokens, metrics)
+        if metrics is not None:
+            metrics.count(f'connectors_{lang}', len(connectors_in_triple[lang]))
     return connectors_in_triple
 
-def align_connectors(extracted_connectors):
+def _compiled(connector_list):
+    """Compiles a connector list into a ConnectorMatcher, unless it is one."""
+    if isinstance(connector_list, (ConnectorMatcher, LanguageMatchers)):
+        return connector_list
+    return ConnectorMatcher(connector_list)
+
+def align_connectors(extracted_connectors, method='greedy'):
     """
     Align connectors sentence-triple-wise into a dict of the form
     {lang: {color: ([index_de], [index_en], [index_it])}}
+    Connectors of the language with most connectors are aligned with
+    connectors of the other languages sharing a relation. With method
+    'greedy' each takes the first such connector still free, with method
+    'optimal' a maximum-weight assignment on relation overlap and position
+    is computed per language pair.
     """
-    colors = ['#FF2828', '#00c853', '#512da8', '#ff5722', '#4e342e', '#2962ff',
-              '#e91e63', '#26c6da', '#ffd600', '#9e9d24', '#004d40', '#455a64',
-              '#9C1717']
-    result = {'de': dict(), 'en': dict(), 'it': dict()}
+    colors = chain(COLORS, _spare_colors())
+    result = {lang: dict() for lang in extracted_connectors}
     # if no connector in the sentence
-    if len(extracted_connectors['de']) == 0 \
-        and len(extracted_connectors['en']) == 0 \
-        and len(extracted_connectors['it']) == 0:
+    if all(len(connectors) == 0
+           for connectors in extracted_connectors.values()):
         pass
     # if only one connector in the sentence
-    elif len(extracted_connectors['de']) == 1 \
-        and len(extracted_connectors['en']) == 1 \
-        and len(extracted_connectors['it']) == 1:
-        color = colors.pop(0)
+    elif all(len(connectors) == 1
+             for connectors in extracted_connectors.values()):
+        color = next(colors)
         for lang in extracted_connectors.keys():
             for index in extracted_connectors[lang][0][1]:
                 result[lang].update({index: color})
@@ -112,27 +91,26 @@ def align_connectors(extracted_connectors):
         # find language with most connectors in this sentence
         lang_with_most_cons = max((len(v), k) for k, v
                                    in extracted_connectors.items())[1]
-        other_langs = ['de', 'en', 'it']
-        other_langs.remove(lang_with_most_cons)
-        already_aligned = {lang: [] for lang in other_langs}
+        other_langs = [lang for lang in extracted_connectors
+                       if lang != lang_with_most_cons]
+        # relations as sets, computed once per connector
+        relation_sets = {lang: [frozenset(con[2]) for con in connectors]
+                         for lang, connectors in extracted_connectors.items()}
+        find_partners = ALIGNMENT_METHODS[method]
+        partners = {lang: find_partners(relation_sets[lang_with_most_cons],
+                                        relation_sets[lang])
+                    for lang in other_langs}
         # iterate through connectors of language with most connectors in sentence
-        for first_lang_connector in extracted_connectors[lang_with_most_cons]:
+        for position, first_lang_connector in enumerate(
+                extracted_connectors[lang_with_most_cons]):
             # connectors without a relation are ignored
             if first_lang_connector[2]:
                 align_con = {lang_with_most_cons: first_lang_connector[1]}
                 for lang in other_langs:
-                    index = None
-                    for con in extracted_connectors[lang]:
-                        if not con[1] in already_aligned[lang]:
-                            if con[2]:
-                                # align connectors if they share a relation
-                                if any(relation in con[2] for relation
-                                       in first_lang_connector[2]):
-                                    index = con[1]
-                                    already_aligned[lang].append(con[1])
-                                    break
-                    align_con[lang] = index
-                color = colors.pop(0)
+                    partner = partners[lang].get(position)
+                    align_con[lang] = None if partner is None \
+                        else extracted_connectors[lang][partner][1]
+                color = next(colors)
                 # save all aligned connectors for this sentence
                 #    with the same color-key
                 for lang, index_list in align_con.items():
@@ -140,19 +118,77 @@ def align_connectors(extracted_connectors):
                         for index in index_list:
                             result[lang].update({index: color})
         # color all connectors that couldn't be aligned on their own
-        not_aligned = {'de': list(), 'en': list(), 'it': list()}
         for lang in extracted_connectors.keys():
             for connector in extracted_connectors[lang]:
                 if connector[1][0] not in result[lang].keys():
-                    color = colors.pop(0)
+                    color = next(colors)
                     for index in connector[1]:
                         result[lang].update({index: color})
     return result
 
-def sent_to_html_str(sent, aligned_connectors, lang):
-    """Converts a sentence to an html-string."""
+def _greedy_partners(first_relations, other_relations):
+    """
+    Returns {position in first: position in other} aligning every connector
+    (with relations) of first with the first free connector of other sharing
+    a relation, looked up in an index relation -> positions.
+    """
+    positions_of_relation = dict()
+    for position, relations in enumerate(other_relations):
+        for relation in relations:
+            positions_of_relation.setdefault(relation, []).append(position)
+    partners = dict()
+    already_aligned = set()
+    for first_position, relations in enumerate(first_relations):
+        candidates = {position for relation in relations
+                      for position in positions_of_relation.get(relation, ())}
+        candidates -= already_aligned
+        if candidates:
+            partners[first_position] = min(candidates)
+            already_aligned.add(partners[first_position])
+    return partners
+
+def _optimal_partners(first_relations, other_relations):
+    """
+    Returns {position in first: position in other} of a maximum-weight
+    assignment between connectors sharing a relation. The weight is the
+    Jaccard overlap of the relations plus a bonus for similar relative
+    positions in the sentence.
+    """
+    weights = [[_alignment_weight(first, i, len(first_relations),
+                                  other, j, len(other_relations))
+                for j, other in enumerate(other_relations)]
+               for i, first in enumerate(first_relations)]
+    return {i: j for i, j in max_weight_assignment(weights) if weights[i][j]}
+
+# weight of the position bonus relative to the relation overlap (at most 1)
+_POSITION_WEIGHT = 0.25
+
+def _alignment_weight(first, first_position, first_count,
+                      other, other_position, other_count):
+    overlap = len(first & other)
+    if not overlap:
+        return 0
+    first_position /= max(first_count - 1, 1)
+    other_position /= max(other_count - 1, 1)
+    return (overlap / len(first | other)
+            + _POSITION_WEIGHT * (1 - abs(first_position - other_position)))
+
+# partner finders of the alignment methods, by name (see align_connectors)
+ALIGNMENT_METHODS = {'greedy': _greedy_partners, 'optimal': _optimal_partners}
+
+def sent_to_html_str(sent, aligned_connectors, lang, markup='font'):
+    """
+    Converts a sentence (str or TokenizedSent) to an html-string.
+    With markup 'font' every connector token gets its own font tag, with
+    markup 'compact' runs of tokens of the same color share one span whose
+    css class is defined in PAGE_HEADER.
+    """
+    if not isinstance(sent, TokenizedSent):
+        sent = tokenize(sent)
+    if markup == 'compact':
+        return _sent_to_compact_html_str(sent.tokens, aligned_connectors[lang])
     html_elements = ['<p>']
-    for i, token in enumerate(word_tokenize(sent)):
+    for i, token in enumerate(sent.tokens):
         if i in aligned_connectors[lang].keys():
             color = aligned_connectors[lang].get(i)
             html_elements.append(f'<font color={color}>{token} </font>')
@@ -162,86 +198,476 @@ def sent_to_html_str(sent, aligned_connectors, lang):
     html_elements.append('\n')
     return ''.join(html_elements)
 
-def write_as_html(path_out, sent_triples, connector_list):
+def _sent_to_compact_html_str(tokens, colors_by_index):
+    html_elements = ['<p>']
+    runs = groupby(enumerate(tokens),
+                   key=lambda token: colors_by_index.get(token[0]))
+    for color, run in runs:
+        text = escape(''.join(f'{token} ' for _, token in run), quote=False)
+        if color is None:
+            html_elements.append(text)
+        else:
+            css_class = _CSS_CLASSES.get(color)
+            html_elements.append(
+                f'<span class={css_class}>{text}</span>' if css_class else
+                f'<span style="color:{color}">{text}</span>')
+    html_elements.append('</p>\n')
+    return ''.join(html_elements)
+
+def align_batch(triples, connector_matcher, alignment='greedy', html=False,
+                tokenizer='nltk'):
+    """
+    Extracts and aligns the connectors of SentTriples (or parallel sentences
+    in other languages, see corpus_reader.parallel_sent_type), tokenized
+    unless they already are. Returns one dict per triple with the connectors
+    of every language (tokens, indices, relations and color, connectors of
+    the same color are aligned) and, if html is set, the rendered html.
+    """
+    results = []
+    for triple in triples:
+        if not is_tokenized(triple):
+            triple = tokenize_triple(triple, tokenizer)
+        extracted_connectors = extract_connectors(triple, connector_matcher)
+        aligned_connectors = align_connectors(extracted_connectors, alignment)
+        result = {'connectors': {
+            lang: [{'tokens': tokens, 'indices': indices,
+                    'relations': list(relations),
+                    'color': aligned_connectors[lang].get(indices[0])}
+                   for tokens, indices, relations in connectors]
+            for lang, connectors in extracted_connectors.items()
+            }}
+        if html:
+            result['html'] = ''.join(
+                sent_to_html_str(sent, aligned_connectors, lang)
+                for lang, sent in triple._asdict().items())
+        results.append(result)
+    return results
+
+def write_as_html(path_out, sent_triples, connector_list, tokenizer='nltk',
+                  workers=1, chunk_size=64, alignment='greedy',
+                  occurrences_dir=None, langs=LANGS, metrics=None):
     """
     Converts all sentence triples to html-strings, writes to the given path and
-    records alignment statistics in txt-files.
+    records alignment statistics in csv-files. sent_triples can be any
+    iterable (e.g. corpus_reader.iter_sent_triples) of parallel sentences in
+    langs, it is consumed lazily.
+    Every triple is tokenized once with the given tokenizer backend
+    (see tokenizer.TOKENIZERS) and aligned with the given alignment method
+    (see align_connectors).
+    With workers > 1 the triples are processed in chunks of chunk_size by a
+    process pool; the output is identical to the serial one. The workers
+    read the chunks of a binary_corpus.BinaryCorpus from their own memory
+    map.
+    With occurrences_dir all connector occurrences are saved there as an
+    occurrence_store.OccurrenceStore. With metrics (an
+    instrumentation.Metrics) counters, stage timings and latencies of the
+    run are collected in it.
     """
-    with open(path_out, mode='w', encoding='utf-8') as f_out:
-        de_en_stat = Counter()
-        de_it_stat = Counter()
-        en_it_stat = Counter()
+    # numpy is only imported by runs that render, not by plain alignment
+    from binary_corpus import BinaryCorpus
+    connector_list = _compiled(connector_list)
+    chunks = sent_triples.chunks(chunk_size) \
+        if isinstance(sent_triples, BinaryCorpus) \
+        else _chunked(sent_triples, chunk_size)
+    _write_results(path_out, _map_in_order(
+        _process_chunk, chunks,
+        (connector_list, tokenizer, alignment, 'font', metrics is not None),
+        workers), occurrences_dir, langs, metrics)
+
+def write_corpus_as_html(path_out, corpus_root, connector_list,
+                         cache_dir=CACHE_DIR, corpus_filepaths=None,
+                         tokenizer='nltk', workers=1, alignment='greedy',
+                         occurrences_dir=None, langs=LANGS, metrics=None):
+    """
+    Like write_as_html for all documents of the corpus in langs, but caches
+    the results of every document in cache_dir. Only documents whose xml files
+    (or the lexicon, tokenizer or alignment method) changed since the last run
+    are processed again, all others are merged from the cache.
+    """
+    connector_list = _compiled(connector_list)
+    if corpus_filepaths is None:
+        corpus_filepaths = list_xml_files(os.path.join(corpus_root, langs[0]))
+    documents = ((corpus_root, xml_filename, cache_dir, tuple(langs))
+                 for xml_filename in corpus_filepaths)
+    _write_results(path_out, _map_in_order(
+        _process_document, documents,
+        (connector_list, tokenizer, alignment, 'font', metrics is not None),
+        workers), occurrences_dir, langs, metrics)
+
+def write_corpus_as_pages(dir_out, corpus_root, connector_list,
+                          cache_dir=CACHE_DIR, corpus_filepaths=None,
+                          triples_per_page=None, tokenizer='nltk', workers=1,
+                          alignment='greedy', occurrences_dir=None,
+                          langs=LANGS, metrics=None):
+    """
+    Like write_corpus_as_html, but writes one html page per document (or per
+    triples_per_page triples) in compact markup to dir_out, together with an
+    index.html linking to all documents with their connector counts.
+    """
+    if triples_per_page is not None and triples_per_page < 1:
+        raise ValueError(f'triples_per_page must be at least 1, '
+                         f'not {triples_per_page}')
+    connector_list = _compiled(connector_list)
+    if corpus_filepaths is None:
+        corpus_filepaths = list_xml_files(os.path.join(corpus_root, langs[0]))
+    documents = ((corpus_root, xml_filename, cache_dir, tuple(langs))
+                 for xml_filename in corpus_filepaths)
+    results = _map_in_order(_process_document, documents,
+                            (connector_list, tokenizer, alignment, 'compact',
+                             metrics is not None),
+                            workers)
+    doc_ids = [os.path.splitext(xml_filename)[0]
+               for xml_filename in corpus_filepaths]
+    _write_pages(dir_out, zip(doc_ids, results), triples_per_page,
+                 occurrences_dir, langs, metrics)
+
+# html-strings (one per triple, without triple_id), (doc_id, edu_id) and
+# (extracted, aligned) connectors per triple, the alignment_stats.AlignmentStats
+# of their aligned groups and the languages of the triples (both None without
+# triples)
+# and the instrumentation.Metrics of processing them (None if disabled)
+ChunkResult = namedtuple('ChunkResult',
+                         'html ids connectors stats langs metrics')
+
+# size of the write buffer of html files
+_BUFFER_SIZE = 1 << 20
 
+def _write_results(path_out, results, occurrences_dir=None, langs=LANGS,
+                   metrics=None):
+    """
+    Writes the html of ChunkResults in order and their merged stats of the
+    pairs of langs (and connector occurrences to occurrences_dir), merging
+    their metrics.
+    """
+    from alignment_stats import AlignmentStats
+    from occurrence_store import OccurrenceStore
+    stats = None
+    occurrences = OccurrenceStore() if occurrences_dir else None
+    with open(path_out, mode='w', encoding='utf-8',
+              buffering=_BUFFER_SIZE) as f_out:
         f_out.write('<meta charset="utf-8">\n')
-        for triple_id, triple in enumerate(sent_triples):
-            extracted_connectors = extract_connectors(triple, connector_list)
-            aligned_connectors = align_connectors(extracted_connectors)
-
-            # update HTML-file
-            f_out.write(f'<p>{triple_id}</p>\n')
-            langs = {0: 'de', 1: 'en', 2: 'it'}
-            for i, sent in enumerate(triple):
-                f_out.write(sent_to_html_str(sent,
-                                             aligned_connectors, langs[i]))
-            f_out.write('\n')
-
-            # update stats
-            _update_alignment_stats(triple, aligned_connectors, de_en_stat,
-                                    de_it_stat, en_it_stat)
-
-        _stat_as_csv(de_en_stat, 'output/de_en_stat.csv')
-        _stat_as_csv(de_it_stat, 'output/de_it_stat.csv')
-        _stat_as_csv(en_it_stat, 'output/en_it_stat.csv')
-
-def _update_alignment_stats(sent_triple, aligned_connectors, de_en_stat,
-                            de_it_stat, en_it_stat):
-    tokenized_sents = dict()
-    tokenized_sents['de'] = word_tokenize(sent_triple.de)
-    tokenized_sents['en'] = word_tokenize(sent_triple.en)
-    tokenized_sents['it'] = word_tokenize(sent_triple.it)
-
-    # figure out alignments according to color
-    color_dict = dict()
-    for lang, value in aligned_connectors.items():
-        for i, color in value.items():
-            if color not in color_dict:
-                color_dict[color] = {'de':[], 'en':[], 'it':[]}
-
-            color_dict[color][lang].append(tokenized_sents[lang][i])
-
-    for color in color_dict:
-        de_connector = ' '.join(color_dict[color]['de']).lower()
-        en_connector = ' '.join(color_dict[color]['en']).lower()
-        it_connector = ' '.join(color_dict[color]['it']).lower()
-
-        de_en_stat[(de_connector, en_connector)] = de_en_stat.get((de_connector,
-                                                   en_connector), 0) + 1
-        de_it_stat[(de_connector, it_connector)] = de_it_stat.get((de_connector,
-                                                   it_connector), 0) + 1
-        en_it_stat[(en_connector, it_connector)] = en_it_stat.get((en_connector,
-                                                   it_connector), 0) + 1
-
-def _stat_as_csv(counter_obj, output_path):
-    with open(output_path, mode='w', encoding='utf-8') as f_out:
-        for key, value in sorted(counter_obj.items(), key=lambda pair: pair[1],
-                                 reverse=True):
-            f_out.write(f"{key},{value}\n")
+        triple_id = 0
+        # results arrive in triple_id order, so are the merged stats
+        for result in results:
+            start = time.perf_counter()
+            for html in result.html:
+                f_out.write(f'<p>{triple_id}</p>\n')
+                f_out.write(html)
+                triple_id += 1
+            stats = _merge_stats(stats, result)
+            if occurrences is not None:
+                occurrences.add(result)
+            if metrics is not None:
+                metrics.lap('io', start)
+                metrics.merge(result.metrics)
+                metrics.show_progress()
+    # without triples no result has stats, the csv files are written empty
+    if stats is None:
+        stats = AlignmentStats(langs)
+    stats.write('output')
+    if occurrences is not None:
+        occurrences.save(occurrences_dir)
+    if metrics is not None:
+        metrics.show_progress(final=True)
 
-if __name__ == '__main__':
-    # connector lists
-    CONNECTORS_DE = read_connector_list('data/connectors_df/df_de.csv')
-    CONNECTORS_EN = read_connector_list('data/connectors_df/df_en.csv')
-    CONNECTORS_IT = read_connector_list('data/connectors_df/df_it.csv')
-    connector_list = {'single': {}, 'double': {}}
-    {connector_list['single'].update(lang) for lang in [CONNECTORS_DE['single'],
-                              CONNECTORS_EN['single'], CONNECTORS_IT['single']]}
-    {connector_list['double'].update(lang) for lang in [CONNECTORS_DE['double'],
-                              CONNECTORS_EN['double'], CONNECTORS_IT['double']]}
-    # get all sentence triples
+def _write_pages(dir_out, doc_results, triples_per_page, occurrences_dir=None,
+                 langs=LANGS, metrics=None):
+    """
+    Writes (doc_id, ChunkResult) pairs as html pages, one per document or per
+    triples_per_page triples, an index.html and the merged stats (and
+    connector occurrences to occurrences_dir), merging their metrics.
+    """
+    from alignment_stats import AlignmentStats
+    from occurrence_store import OccurrenceStore
+    os.makedirs(dir_out, exist_ok=True)
+    stats = AlignmentStats(langs)
+    occurrences = OccurrenceStore() if occurrences_dir else None
+    index_rows = []
+    f_page = None
+    page_name = None
+    triple_id = 0
+    try:
+        for doc_id, result in doc_results:
+            start = time.perf_counter()
+            for i, html in enumerate(result.html):
+                # start a new page for every document or every full page
+                if triples_per_page is None and i == 0 \
+                        or triples_per_page and triple_id % triples_per_page == 0:
+                    if f_page is not None:
+                        f_page.close()
+                    # prefixed, so that no page name is index.html
+                    page_name = f'doc_{doc_id}' if triples_per_page is None \
+                        else f'page_{triple_id // triples_per_page:05d}'
+                    page_name += '.html'
+                    f_page = open(os.path.join(dir_out, page_name), mode='w',
+                                  encoding='utf-8', buffering=_BUFFER_SIZE)
+                    f_page.write(PAGE_HEADER)
+                    f_page.write('<p><a href="index.html">index</a></p>\n')
+                if i == 0:
+                    index_rows.append(_index_row(doc_id, page_name, triple_id,
+                                                 result, langs))
+                f_page.write(f'<p id=t{triple_id}>{triple_id}</p>\n')
+                f_page.write(html)
+                triple_id += 1
+            stats = _merge_stats(stats, result)
+            if occurrences is not None:
+                occurrences.add(result)
+            if metrics is not None:
+                metrics.lap('io', start)
+                metrics.merge(result.metrics)
+                metrics.show_progress()
+    finally:
+        if f_page is not None:
+            f_page.close()
+
+    with open(os.path.join(dir_out, 'index.html'), mode='w',
+              encoding='utf-8') as f_index:
+        f_index.write('<meta charset="utf-8">\n<table>\n'
+                      '<tr><th>document</th><th>triples</th>')
+        f_index.write(''.join(f'<th>{lang}</th>' for lang in langs))
+        f_index.write('</tr>\n')
+        f_index.writelines(index_rows)
+        f_index.write('</table>\n')
+    stats.write('output')
+    if occurrences is not None:
+        occurrences.save(occurrences_dir)
+    if metrics is not None:
+        metrics.show_progress(final=True)
+
+def _index_row(doc_id, page_name, first_triple_id, result, langs):
+    """Returns the index.html table row of a document with its connector counts."""
+    counts = Counter()
+    for extracted_connectors, _ in result.connectors:
+        for lang, connectors in extracted_connectors.items():
+            counts[lang] += len(connectors)
+    return (f'<tr><td><a href="{escape(quote(page_name))}#t{first_triple_id}">'
+            f'{escape(doc_id)}</a>'
+            f'</td><td>{len(result.html)}</td>'
+            + ''.join(f'<td>{counts[lang]}</td>' for lang in langs)
+            + '</tr>\n')
+
+def _merge_stats(stats, result):
+    """Merges the AlignmentStats of a ChunkResult into stats (None at first)."""
+    from alignment_stats import AlignmentStats
+    if result.stats is None:
+        return stats
+    if stats is None:
+        stats = AlignmentStats(result.langs)
+    stats.merge(result.stats)
+    return stats
+
+def _process_chunk(chunk, connector_list, tokenizer, alignment='greedy',
+                   markup='font', instrument=False):
+    """
+    Extracts, aligns and renders a chunk of triples into a ChunkResult, with
+    the Metrics of every stage if instrument is set.
+    """
+    from alignment_stats import AlignmentStats
+    metrics = Metrics() if instrument else None
+    result = ChunkResult([], [], [], None, None, metrics)
+    stats = None
+    if metrics is not None:
+        start = time.perf_counter()
+    for triple in chunk:
+        if metrics is not None:
+            start = metrics.lap('read', start)
+        if not is_tokenized(triple):
+            triple = tokenize_triple(triple, tokenizer)
+            if metrics is not None:
+                start = metrics.lap('tokenization', start)
+        extracted_connectors = extract_connectors(triple, connector_list,
+                                                  metrics)
+        if metrics is not None:
+            start = metrics.lap('extract_connectors', start)
+        aligned_connectors = align_connectors(extracted_connectors, alignment)
+        if metrics is not None:
+            start = metrics.lap('align_connectors', start)
+            _count_palette(aligned_connectors, metrics)
+        result.ids.append((triple.doc_id, triple.edu_id))
+        result.connectors.append((extracted_connectors, aligned_connectors))
+
+        # update HTML-file
+        html_elements = []
+        for lang, sent in triple._asdict().items():
+            html_elements.append(sent_to_html_str(sent, aligned_connectors,
+                                                  lang, markup))
+        html_elements.append('\n')
+        result.html.append(''.join(html_elements))
+        if metrics is not None:
+            start = metrics.lap('rendering', start)
+
+        # update stats
+        if stats is None:
+            stats = AlignmentStats(triple._fields)
+        stats.add(extracted_connectors, aligned_connectors)
+        if metrics is not None:
+            metrics.count('triples')
+            start = metrics.lap('stats', start)
+    if result.ids:
+        result = result._replace(stats=stats, langs=triple._fields)
+    return result
+
+def _count_palette(aligned_connectors, metrics):
+    """Counts the triples with more aligned groups than COLORS."""
+    groups = len({color for colors_by_index in aligned_connectors.values()
+                  for color in colors_by_index.values()})
+    if groups > len(COLORS):
+        metrics.count('palette_exhausted')
+        metrics.count('spare_colors', groups - len(COLORS))
+
+def _process_document(document, connector_list, tokenizer, alignment='greedy',
+                      markup='font', instrument=False):
+    """
+    Returns the ChunkResult of all triples of a (corpus_root, xml_filename,
+    cache_dir, langs) document, from the cache if it is up to date.
+    """
+    start = time.perf_counter()
+    corpus_root, xml_filename, cache_dir, langs = document
+    key = document_key(corpus_root, xml_filename, connector_list,
+                       tokenizer, alignment, markup, langs=langs)
+    cache_dir = options_cache_dir(cache_dir, connector_list, tokenizer,
+                                  alignment, markup, langs=langs)
+    result = load_document_result(cache_dir, xml_filename, key)
+    if result is None:
+        sent_triples = iter_sent_triples(corpus_root, [xml_filename], langs)
+        result = _process_chunk(sent_triples, connector_list, tokenizer,
+                                alignment, markup, instrument)
+        # metrics describe this run only
+        save_document_result(cache_dir, xml_filename, key,
+                             result._replace(metrics=None))
+    elif instrument:
+        # counted again from the cached connectors, lookups and stage
+        # timings only cover processed documents
+        result = result._replace(metrics=Metrics())
+        result.metrics.count('documents_cached')
+        result.metrics.count('triples', len(result.html))
+        for extracted_connectors, aligned_connectors in result.connectors:
+            for lang, connectors in extracted_connectors.items():
+                result.metrics.count(f'connectors_{lang}', len(connectors))
+            _count_palette(aligned_connectors, result.metrics)
+    if instrument:
+        result.metrics.count('documents')
+        result.metrics.observe('document_seconds',
+                               time.perf_counter() - start)
+    return result
+
+def _map_in_order(func, items, args, workers):
+    """
+    Yields func(item, *args) for all items in order, computed by a process
+    pool if workers > 1.
+    """
+    if workers <= 1:
+        for item in items:
+            yield func(item, *args)
+        return
+    from multiprocessing import Pool
+    pool = Pool(workers, initializer=_init_worker, initargs=args)
+    try:
+        yield from _imap_bounded(pool, _run_in_worker,
+                                 ((func, item) for item in items),
+                                 window=2 * workers)
+    finally:
+        pool.terminate()
+
+# arguments for the functions run by a pool worker, set by _init_worker
+_worker_args = None
+
+def _init_worker(*args):
+    global _worker_args
+    _worker_args = args
+
+def _run_in_worker(task):
+    func, item = task
+    return func(item, *_worker_args)
+
+def _imap_bounded(pool, func, iterable, window):
+    """
+    Like pool.imap, but keeps at most window items of iterable in flight,
+    so that lazy input is not read ahead into memory.
+    """
+    pending = deque()
+    for item in iterable:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+def _chunked(iterable, size):
+    """Yields lists of at most size consecutive items of iterable."""
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+def main(argv=None, prog=None):
+    """Renders the corpus with the command line options in argv."""
+    parser = argparse.ArgumentParser(prog=prog, description=__doc__)
+    parser.add_argument('workers', nargs='?', type=int, default=1,
+                        help='number of worker processes, e.g. 8')
+    parser.add_argument('alignment', nargs='?', default='greedy',
+                        choices=sorted(ALIGNMENT_METHODS),
+                        help='alignment method')
+    parser.add_argument('--pages', metavar='DIR',
+                        help='write one page per document and an index.html '
+                             'to DIR instead of output/output.html')
+    parser.add_argument('--triples-per-page', type=int,
+                        help='with --pages, split pages by number of triples '
+                             'instead of by document')
+    parser.add_argument('--occurrences', metavar='DIR',
+                        help='save all connector occurrences to DIR as a '
+                             'columnar store (see occurrence_store.py)')
+    parser.add_argument('--langs', nargs='+', default=list(LANGS),
+                        help='languages of the corpus and connector lists')
+    parser.add_argument('--corpus', metavar='DIR',
+                        help='read the pre-tokenized corpus converted to DIR '
+                             '(see binary_corpus.py) instead of the xml files, '
+                             'without the document cache')
+    parser.add_argument('--metrics', metavar='FILE',
+                        help='write a json report of counters, stage timings '
+                             'and document latencies of the run to FILE')
+    parser.add_argument('--progress', action='store_true',
+                        help='show a progress line on stderr')
+    args = parser.parse_args(argv)
+    if args.triples_per_page is not None and args.triples_per_page < 1:
+        parser.error('--triples-per-page must be at least 1')
+    if args.corpus and args.pages:
+        parser.error('--pages cannot be combined with --corpus')
+    if args.triples_per_page is not None and not args.pages:
+        parser.error('--triples-per-page needs --pages')
+    metrics = Metrics(progress=args.progress) \
+        if args.metrics or args.progress else None
+
+    corpus = None
+    if args.corpus:
+        from binary_corpus import BinaryCorpus
+        corpus = BinaryCorpus.load(args.corpus)
+    langs = corpus.langs if corpus else args.langs
+    # connector lists of every language, compiled once for all sentence triples
+    connector_matcher = load_language_matchers(langs)
     corpus_root = os.path.join('data', 'corpus')
-    all_sent_triples = all_xmls_to_sent_triples(
-        corpus_root,
-        list_xml_files(os.path.join(corpus_root, 'de'))
-        )
-    write_as_html(os.path.join('output', 'output.html'),
-                  all_sent_triples, connector_list)
+    if corpus:
+        write_as_html(os.path.join('output', 'output.html'), corpus,
+                      connector_matcher, workers=args.workers,
+                      alignment=args.alignment,
+                      occurrences_dir=args.occurrences, langs=langs,
+                      metrics=metrics)
+    # only documents changed since the last run are processed again
+    elif args.pages:
+        write_corpus_as_pages(args.pages, corpus_root, connector_matcher,
+                              triples_per_page=args.triples_per_page,
+                              workers=args.workers, alignment=args.alignment,
+                              occurrences_dir=args.occurrences,
+                              langs=args.langs, metrics=metrics)
+    else:
+        write_corpus_as_html(os.path.join('output', 'output.html'),
+                             corpus_root, connector_matcher,
+                             workers=args.workers, alignment=args.alignment,
+                             occurrences_dir=args.occurrences,
+                             langs=args.langs, metrics=metrics)
+    if args.metrics:
+        metrics.save(args.metrics)
+
+if __name__ == '__main__':
+    main()
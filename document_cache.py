@@ -0,0 +1,75 @@
+"""Per-document cache of extraction, alignment, html and stats results."""
+import hashlib
+import os
+import pickle
+from corpus_reader import LANGS
+
+CACHE_DIR = os.path.join('output', 'cache')
+# bump when the layout of the cached results changes
+CACHE_VERSION = 7
+
+
+def options_key(connector_matcher, *options, langs=LANGS):
+    """
+    Returns a hash of the languages, the fingerprint of the connector lexicon
+    and further processing options (e.g. tokenizer, alignment method and
+    markup), i.e. of everything but the documents.
+    """
+    sha = hashlib.sha256(str(CACHE_VERSION).encode())
+    sha.update(repr(tuple(langs)).encode())
+    sha.update(lexicon_fingerprint(connector_matcher).encode())
+    sha.update(repr(options).encode())
+    return sha.hexdigest()
+
+def options_cache_dir(cache_dir, connector_matcher, *options, langs=LANGS):
+    """
+    Returns the subdirectory of cache_dir for the results of one set of
+    options, so that runs with other options do not evict them.
+    """
+    return os.path.join(cache_dir, options_key(connector_matcher, *options,
+                                               langs=langs)[:16])
+
+def document_key(corpus_root, xml_filename, connector_matcher, *options,
+                 langs=LANGS):
+    """
+    Returns a hash of the xml files of a document in all languages and of
+    the options_key.
+    """
+    sha = hashlib.sha256(options_key(connector_matcher, *options,
+                                     langs=langs).encode())
+    for lang in langs:
+        with open(os.path.join(corpus_root, lang, xml_filename), 'rb') as f_in:
+            sha.update(f_in.read())
+    return sha.hexdigest()
+
+def lexicon_fingerprint(connector_matcher):
+    """Returns the fingerprint of a ConnectorMatcher, hashing its trie if unset."""
+    if connector_matcher.fingerprint is None:
+        connector_matcher.fingerprint = hashlib.sha256(
+            pickle.dumps(connector_matcher.trie)).hexdigest()
+    return connector_matcher.fingerprint
+
+def load_document_result(cache_dir, xml_filename, key):
+    """Returns the cached result of a document, None if missing or outdated."""
+    try:
+        with open(_cache_path(cache_dir, xml_filename), 'rb') as f_in:
+            cached = pickle.load(f_in)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError,
+            ImportError):
+        return None
+    return cached['result'] if cached.get('key') == key else None
+
+def save_document_result(cache_dir, xml_filename, key, result):
+    """Caches the result of a document under the given key."""
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = _cache_path(cache_dir, xml_filename)
+    # write to a temporary file first, so that readers never see half a result
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f_out:
+        pickle.dump({'key': key, 'result': result}, f_out,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+
+def _cache_path(cache_dir, xml_filename):
+    return os.path.join(cache_dir,
+                        os.path.splitext(xml_filename)[0] + '.pickle')
@@ -5,196 +5,234 @@
 # See also:
 # https://docs.python.org/3/library/xml.etree.elementtree.html
 
+import argparse
+import hashlib
+import json
+import os
 import xml.etree.ElementTree as ET
 import re
-import pandas as pd
+
+COLUMNS = ['connector', 'relation', 'is_pair', 'counterpart']
+
+# relation element and separator of the relation levels for each lexicon
+# format of connective-lex
+LEXICON_FORMATS = {
+    'dimlex': ('pdtb2_relation', '.'),  # relation in the sense attribute
+    'conano': ('coh-relation', '.'),
+    'lico': ('coh-relation', ':'),
+}
+# xml file and format of the lexicon of each language, see build_lexicons
+LEXICONS = {
+    'de': ('data/connectors_xml/ConAnoConnectorLexicon.xml', 'conano'),
+    'en': ('data/connectors_xml/en_dimlex.xml', 'dimlex'),
+    'it': ('data/connectors_xml/LICO-v.1.0.xml', 'lico'),
+}
+CSV_PATH = 'data/connectors_df/df_{}.csv'
+# hashes of the sources and outputs of the last build of every lexicon
+MANIFEST_PATH = 'data/connectors_df/build.json'
+# bump when the records built from a lexicon change
+BUILD_VERSION = 1
 
 
 def find_connectors_en(xml_root):
-    """returns a dataframe with coloumns: 
+    """returns a dataframe with coloumns:
     connector | relation | is_pair | counterpart for EN connectors.
     """
-    df = pd.DataFrame(columns=['connector', 'relation', 'is_pair', 'counterpart'])
-    for entry in xml_root.iter('entry'):
-        # find connector/ connector pairs
-        connector_parts = _find_connector_parts_for_an_entry(entry, lang='en')
-        # find all relations
-        relations = _find_all_relations_for_an_entry(entry, lang='en')
-        # append df row
-        new_rows = _generate_connector_df_rows(connector_parts, relations)
-                
-        for new_row in new_rows:
-            df = pd.concat([df, new_row])
- 
-    return df
+    return build_connector_df(xml_root, 'dimlex')
 
 def find_connectors_de(xml_root):
-    """returns a dataframe with coloumns: 
+    """returns a dataframe with coloumns:
     connector | relation | is_pair | counterpart for DE connectors.
     """
-    df = pd.DataFrame(
-        columns=['connector', 'relation', 'is_pair', 'counterpart'])
-    for entry in xml_root.iter('entry'):
-        connector_parts = _find_connector_parts_for_an_entry(entry, lang='de')
-        
-        connectors_relations = {}
-        # Traverse tree to check each entry for connector alternatives and 
-        # their relations
-        # List of connector alternatives
-        
-        connector_alternatives = []
-        for orth in entry.iter('orth'):
-            connector = orth.find('part').text.lower()
-            connector_alternatives.append(connector)
-            # Clean spaces before commas
-            for connector in connector_alternatives:
-                connector = re.sub('\s,', ',', connector)
-            
-            # List of relations for connector_alternatives
-            # relations = _find_all_relations_for_an_entry(entry, lang='de')
-            relations = []
-            for syn in entry.iter('syn'):
-                for sem in syn.iter('sem'):
-                    for relation in sem.iter('coh-relation'):
-                        rel = relation.text
-                        # Make sure entry is not empty
-                        if rel != None:
-                            rel = rel.lower()
-                            # Avoid cutting off for one-part relations
-                            if rel.find('.') == -1:
-                                relations.append(rel)
-                            else:
-                                relations.append(
-                                    '.'.join(re.split('[.]+', rel)[:2])
-                                    )
-            connectors_relations[connector] = list(set(relations))
-
-        # append df row
-        new_rows = _generate_connector_df_rows(connector_parts, relations)
-        for new_row in new_rows:
-            df = pd.concat([df, new_row])
-    return df
+    return build_connector_df(xml_root, 'conano')
 
 
 def find_connectors_it(xml_root):
-    """returns a dataframe with coloumns: 
+    """returns a dataframe with coloumns:
     connector | relation | is_pair | counterpart. for IT connectors.
     """
-    df = pd.DataFrame(
-        columns=['connector', 'relation', 'is_pair', 'counterpart'])
-    for entry in xml_root.iter('entry'):
+    return build_connector_df(xml_root, 'lico')
+
+
+def build_connector_df(xml_root, lexicon_format):
+    """returns a dataframe with coloumns:
+    connector | relation | is_pair | counterpart for a lexicon in one of the
+    LEXICON_FORMATS, built from the records of a single pass over the xml.
+    """
+    import pandas as pd
+    return pd.DataFrame.from_records(
+        list(find_connector_records(xml_root, lexicon_format)),
+        columns=COLUMNS)
+
+
+def find_connector_records(xml_root, lexicon_format):
+    """yields (connector, relation, is_pair, counterpart) records for all
+    entries of a lexicon in one of the LEXICON_FORMATS.
+    """
+    return _records_of_entries(xml_root.iter('entry'), lexicon_format)
+
+
+def iter_entries(xml_filepath):
+    """yields all <entry> elements of a lexicon xml-file while it is parsed,
+    each is cleared after use, so that memory stays constant.
+    """
+    for _, element in ET.iterparse(xml_filepath):
+        if element.tag == 'entry':
+            yield element
+            element.clear()
+
+
+def build_lexicons(lexicons=LEXICONS, csv_path=CSV_PATH,
+                   manifest_path=MANIFEST_PATH, workers=None, force=False):
+    """builds the connector csv of every language of lexicons
+    ({lang: (xml filepath, lexicon format)}) in parallel worker processes.
+    Lexicons whose xml file, format and csv are unchanged since the last
+    build are skipped unless force is set. Returns {lang: 'built'|'unchanged'}.
+    """
+    manifest = _read_manifest(manifest_path)
+    tasks = []
+    status = {}
+    for lang, (xml_filepath, lexicon_format) in lexicons.items():
+        csv_filepath = csv_path.format(lang)
+        source_hash = _file_hash(xml_filepath, f'{BUILD_VERSION} {lexicon_format}')
+        if not force and manifest.get(lang) == {
+                'source': source_hash, 'csv': _file_hash(csv_filepath)}:
+            status[lang] = 'unchanged'
+        else:
+            tasks.append((lang, xml_filepath, lexicon_format, csv_filepath,
+                          source_hash))
+    if len(tasks) > 1 and workers != 1:
+        from multiprocessing import Pool
+        with Pool(min(workers or os.cpu_count(), len(tasks))) as pool:
+            built = pool.map(_build_lexicon, tasks)
+    else:
+        built = [_build_lexicon(task) for task in tasks]
+    for lang, hashes in built:
+        manifest[lang] = hashes
+        status[lang] = 'built'
+    if built:
+        _write_manifest(manifest_path, manifest)
+    return {lang: status[lang] for lang in lexicons}
+
+
+def _build_lexicon(task):
+    """builds the connector csv of a lexicon, returns its manifest entry."""
+    import pandas as pd
+    lang, xml_filepath, lexicon_format, csv_filepath, source_hash = task
+    df = pd.DataFrame.from_records(
+        list(_records_of_entries(iter_entries(xml_filepath), lexicon_format)),
+        columns=COLUMNS)
+    df.to_csv(csv_filepath)
+    return lang, {'source': source_hash, 'csv': _file_hash(csv_filepath)}
+
+
+def _file_hash(filepath, salt=''):
+    """sha256 of salt and the content of a file, None if it does not exist."""
+    sha = hashlib.sha256(salt.encode())
+    try:
+        with open(filepath, 'rb') as f_in:
+            for block in iter(lambda: f_in.read(1 << 20), b''):
+                sha.update(block)
+    except FileNotFoundError:
+        return None
+    return sha.hexdigest()
+
+
+def _read_manifest(manifest_path):
+    try:
+        with open(manifest_path, encoding='utf-8') as f_in:
+            return json.load(f_in)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_manifest(manifest_path, manifest):
+    with open(manifest_path, 'w', encoding='utf-8') as f_out:
+        json.dump(manifest, f_out, indent=2, sort_keys=True)
+
+
+def _records_of_entries(entries, lexicon_format):
+    """yields the records of lexicon entries, see find_connector_records."""
+    for entry in entries:
         # find connector/ connector pairs
-        connector_parts = _find_connector_parts_for_an_entry(entry, lang='it')
-        
-        connectors_relations = {}
-        # Traverse tree to check each entry for connector alternatives and
-        # their relations
-        # List of connector alternatives
-        connector_alternatives = []
-        for orth in entry.iter('orth'):
-            connector = orth.find('part').text.lower()
-            connector_alternatives.append(connector)
-            # Clean spaces before commas
-            for connector in connector_alternatives:
-                connector = re.sub('\s,', ',', connector)           
-            # List of relations for connector_alternatives
-            relations = []
-            for syn in entry.iter('syn'):
-                for sem in syn.iter('sem'):
-                    for relation in sem.iter('coh-relation'):
-                        rel = relation.text
-                        # Make sure entry is not empty
-                        if rel is not None:
-                            rel = rel.lower()
-                            # Avoid cutting off for one-part relations
-                            if rel.find(':') == -1:
-                                relations.append(rel)
-                            else:
-                                relations.append(
-                                    '.'.join(re.split('[:]+', rel)[:2])
-                                    )
-            connectors_relations[connector] = list(set(relations))
-
-        # append df row
-        new_rows = _generate_connector_df_rows(connector_parts, relations)
-        for new_row in new_rows:
-            df = pd.concat([df, new_row])
-
-    return df
-
-
-def _find_connector_parts_for_an_entry(entry, lang):
+        connector_parts = _find_connector_parts_for_an_entry(entry)
+        # find all relations
+        relations = _find_all_relations_for_an_entry(entry, lexicon_format)
+        yield from _generate_connector_records(connector_parts, relations)
+
+
+def _find_connector_parts_for_an_entry(entry):
     """find connector/ connector pairs for an entry in the connector xml-file."""
-    connector_parts = set()
-    if lang.lower() == 'en':
-        for orths in entry.iter('orths'):
-            for orth in orths.iter('orth'):
-                new_orth = [part.text.lower() for part in orth.iter('part')]
-                if len(new_orth) == 2: # double connector as tuple
-                    connector_parts.add((new_orth[0], new_orth[1]))
-                elif len(new_orth) == 1: # single connector
-                    connector_parts.add(new_orth[0])
-
-    elif lang.lower() in ['de', 'it']:
-        for orth in entry.iter('orth'):
-            new_orth = [part.text.lower() for part in orth.iter('part')]
-            if len(new_orth) == 2:  # double connector as tuple
-                connector_parts.add((new_orth[0], new_orth[1]))
-            elif len(new_orth) == 1:  # single connector
-                connector_parts.add(new_orth[0])
-            
-    return connector_parts
-
-
-def _find_all_relations_for_an_entry(entry, lang):
+    # dict as ordered set, keeps the order of the xml-file
+    connector_parts = {}
+    for orth in entry.iter('orth'):
+        new_orth = [part.text.lower() for part in orth.iter('part')]
+        if len(new_orth) == 2:  # double connector as tuple
+            connector_parts[(new_orth[0], new_orth[1])] = None
+        elif len(new_orth) == 1:  # single connector
+            connector_parts[new_orth[0]] = None
+    return list(connector_parts)
+
+
+def _find_all_relations_for_an_entry(entry, lexicon_format):
     """find relation for an entry in the connector xml-file."""
-    relations = []
-    if lang == 'en':
-        for syn in entry.iter('syn'):
-            for sem in syn.iter('sem'):
-                for relation in sem.iter('pdtb2_relation'):
-                    rel = relation.attrib['sense'].lower()
-                    if rel.find('.') == -1: # if no subcategory is specified
-                        relations.append(rel)
-                    else:
-                        # one main relation + one sub-relation 
-                        # (e.g. comparison.contrast)
-                        relations.append(
-                            '.'.join(re.split('[.]+', rel)[:2])
-                            )
-    return list(set(relations))
-    
-
-def _generate_connector_df_rows(connector_parts, all_relations):
-    """creates DataFrame (row) for a connector entry."""
+    tag, separator = LEXICON_FORMATS[lexicon_format]
+    relations = {}
+    for syn in entry.iter('syn'):
+        for sem in syn.iter('sem'):
+            for relation in sem.iter(tag):
+                rel = relation.attrib['sense'] if tag == 'pdtb2_relation' \
+                    else relation.text
+                # Make sure entry is not empty
+                if rel is None:
+                    continue
+                # one main relation + one sub-relation
+                # (e.g. comparison.contrast)
+                rel = '.'.join(re.split(f'[{separator}]+', rel.lower())[:2])
+                relations[rel] = None
+    return list(relations)
+
+
+def _generate_connector_records(connector_parts, all_relations):
+    """creates records (rows) for a connector entry."""
     new_rows = []
-    
+
     for connector in connector_parts:
         if type(connector) is tuple: # double connector
             fst_part, snd_part = connector[0], connector[1]
-            
-            new_rows.append(pd.DataFrame([[fst_part, all_relations, True, snd_part]],
-                                    columns=['connector', 'relation', 'is_pair', 'counterpart'])
-                            )
-            new_rows.append(pd.DataFrame([[snd_part, all_relations, True, fst_part]],
-                                    columns=['connector', 'relation', 'is_pair', 'counterpart'])
-                            )
+            new_rows.append((fst_part, all_relations, True, snd_part))
+            new_rows.append((snd_part, all_relations, True, fst_part))
         else:  # single connector
-            new_rows.append(pd.DataFrame([[connector, all_relations, False, None]],
-                                columns=['connector', 'relation', 'is_pair', 'counterpart'])
-                            )
-    
-    return new_rows
+            new_rows.append((connector, all_relations, False, None))
 
-if __name__ == '__main__':
-    root_de = ET.parse('data/connectors_xml/ConAnoConnectorLexicon.xml').getroot()
-    root_en = ET.parse('data/connectors_xml/en_dimlex.xml').getroot()
-    root_it = ET.parse('data/connectors_xml/LICO-v.1.0.xml').getroot()
+    return new_rows
 
-    connectors_de = find_connectors_de(root_de)
-    connectors_en = find_connectors_en(root_en)
-    connectors_it = find_connectors_it(root_it)
+def main(argv=None, prog=None):
+    """builds the lexicons with the command line options in argv."""
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description='Builds the connector csv files from the connective-lex '
+                    'xml lexicons')
+    parser.add_argument('--lexicon', nargs=3, action='append',
+                        metavar=('LANG', 'XML', 'FORMAT'),
+                        help='build this lexicon (format one of '
+                             f'{", ".join(LEXICON_FORMATS)}) instead of the '
+                             'default ones, can be repeated')
+    parser.add_argument('--workers', type=int,
+                        help='worker processes (default: one per lexicon)')
+    parser.add_argument('--force', action='store_true',
+                        help='rebuild unchanged lexicons as well')
+    args = parser.parse_args(argv)
+
+    lexicons = LEXICONS if args.lexicon is None else {
+        lang: (xml_filepath, lexicon_format)
+        for lang, xml_filepath, lexicon_format in args.lexicon}
+    for lexicon_format in {fmt for _, fmt in lexicons.values()}:
+        if lexicon_format not in LEXICON_FORMATS:
+            parser.error(f'unknown lexicon format {lexicon_format}')
+    for lang, status in build_lexicons(lexicons, workers=args.workers,
+                                       force=args.force).items():
+        print(f'{lang}: {status}')
 
-    connectors_de.to_csv('data/connectors_df/df_de.csv')
-    connectors_en.to_csv('data/connectors_df/df_en.csv')
-    connectors_it.to_csv('data/connectors_df/df_it.csv')
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Opt-in run metrics: counters, stage timers, latency histograms and progress."""
+import json
+import math
+import sys
+import time
+from collections import Counter
+
+
+class Metrics:
+    """
+    Counters, per-stage timers and latency histograms of a run. Worker
+    processes fill their own Metrics, which are merged into the one of the
+    run. Code paths are only instrumented if a Metrics object is passed,
+    so that disabled instrumentation costs a None check.
+    """
+
+    def __init__(self, progress=False):
+        self.counters = Counter()
+        # stage -> [calls, seconds]
+        self.timers = dict()
+        # name -> Counter of upper bucket bounds in seconds (powers of two)
+        self.histograms = dict()
+        self.progress = progress
+        self._start = time.perf_counter()
+        self._last_progress = 0
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def lap(self, stage, start):
+        """Adds the time since start to stage, returns the current time."""
+        now = time.perf_counter()
+        timer = self.timers.setdefault(stage, [0, 0.0])
+        timer[0] += 1
+        timer[1] += now - start
+        return now
+
+    def observe(self, name, seconds):
+        """Adds a duration to the histogram name."""
+        bound = 2.0 ** math.ceil(math.log2(max(seconds, 1e-6)))
+        self.histograms.setdefault(name, Counter())[bound] += 1
+
+    def merge(self, other):
+        """Adds the counters, timers and histograms of other Metrics."""
+        if other is None:
+            return
+        self.counters.update(other.counters)
+        for stage, (calls, seconds) in other.timers.items():
+            timer = self.timers.setdefault(stage, [0, 0.0])
+            timer[0] += calls
+            timer[1] += seconds
+        for name, histogram in other.histograms.items():
+            self.histograms.setdefault(name, Counter()).update(histogram)
+
+    def show_progress(self, final=False):
+        """
+        Rewrites the progress line on stderr (at most every half second,
+        unless final), if progress is enabled.
+        """
+        if not self.progress:
+            return
+        now = time.perf_counter()
+        if not final and now - self._last_progress < 0.5:
+            return
+        self._last_progress = now
+        triples = self.counters['triples']
+        elapsed = now - self._start
+        sys.stderr.write(f"\r{self.counters['documents']} documents, "
+                         f"{triples} triples, "
+                         f"{triples / max(elapsed, 1e-9):.0f} triples/s, "
+                         f"{elapsed:.1f} s" + ('\n' if final else ''))
+        sys.stderr.flush()
+
+    def report(self):
+        """Returns the metrics as json-serializable dict."""
+        elapsed = time.perf_counter() - self._start
+        return {
+            'wall_seconds': elapsed,
+            'triples_per_second': self.counters['triples'] / max(elapsed, 1e-9),
+            'counters': dict(sorted(self.counters.items())),
+            'timers': {stage: {'calls': calls, 'seconds': seconds}
+                       for stage, (calls, seconds) in self.timers.items()},
+            'histograms': {
+                name: {f'<={bound:g}s': count
+                       for bound, count in sorted(histogram.items())}
+                for name, histogram in self.histograms.items()},
+            }
+
+    def save(self, path_out):
+        """Writes the report as json."""
+        with open(path_out, 'w', encoding='utf-8') as f_out:
+            json.dump(self.report(), f_out, indent=2)
+
+    def __getstate__(self):
+        # only the collected data travels between processes
+        return {'counters': self.counters, 'timers': self.timers,
+                'histograms': self.histograms}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.__dict__.update(state)
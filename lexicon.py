@@ -0,0 +1,146 @@
+"""Loading of the connector lists, with a compiled binary cache."""
+import argparse
+import ast
+import csv
+import hashlib
+import os
+import pickle
+from connector_matcher import ConnectorMatcher, LanguageMatchers
+
+# connector list of a language, as written by extract_connectors.py
+CONNECTOR_CSV = 'data/connectors_df/df_{}.csv'
+CONNECTOR_CSVS = ['data/connectors_df/df_de.csv',
+                  'data/connectors_df/df_en.csv',
+                  'data/connectors_df/df_it.csv']
+CACHE_PATH = 'data/connectors_df/connectors.pickle'
+LANGUAGE_CACHE_PATH = 'data/connectors_df/connectors_by_lang.pickle'
+# bump when the layout of the cached ConnectorMatcher changes
+CACHE_VERSION = 5
+
+
+def read_connector_list(txt_filepath):
+    """
+    Returns a dict of connectors read from a csv file.
+    Dict is structured into two dicts, one containing all single connectors,
+    the other containing the connectors with a counterpart. A first part can
+    have several counterparts (e.g. "dafür" with "dass" and "daß"), so its
+    entry maps every counterpart to its relations, whatever the order of
+    the rows.
+    """
+    result = {'single': {}, 'double': {}}
+    with open(txt_filepath, 'r', encoding='utf-8') as f_in:
+        reader = csv.DictReader(f_in)
+        for row in reader:
+            row['connector'] = tuple(row['connector'].split(' '))
+            # get the right types: list and boolean
+            row['relation'] = ast.literal_eval(row['relation'])
+            row['is_pair'] = ast.literal_eval(row['is_pair'])
+            row_values = {key: value for key, value in row.items()
+                          if key in ['relation', 'is_pair', 'counterpart']}
+            if row['is_pair']:
+                double = result['double'].setdefault(
+                    row['connector'], {'is_pair': True, 'counterparts': {}})
+                double['counterparts'][row['counterpart']] = row['relation']
+            else:
+                result['single'][row['connector']] = row_values
+    return result
+
+def connector_csvs(langs):
+    """Returns the connector list csv files of the given languages."""
+    return [CONNECTOR_CSV.format(lang) for lang in langs]
+
+def merge_connector_lists(connector_lists):
+    """Merges connector lists; later lists win for connectors in several."""
+    result = {'single': {}, 'double': {}}
+    for connector_list in connector_lists:
+        result['single'].update(connector_list['single'])
+        result['double'].update(connector_list['double'])
+    return result
+
+def find_collisions(connector_lists):
+    """
+    Returns {connector: [langs]} of all connectors that are in the connector
+    lists of several languages, given as {lang: connector list}.
+    """
+    langs_of_connector = dict()
+    for lang, connector_list in connector_lists.items():
+        for kind in ['single', 'double']:
+            for connector in connector_list[kind]:
+                langs = langs_of_connector.setdefault(' '.join(connector), [])
+                if lang not in langs:
+                    langs.append(lang)
+    return {connector: langs for connector, langs
+            in sorted(langs_of_connector.items()) if len(langs) > 1}
+
+def load_connector_matcher(csv_filepaths=CONNECTOR_CSVS, cache_path=CACHE_PATH):
+    """
+    Returns the compiled ConnectorMatcher of the merged connector lists.
+    It is unpickled from cache_path if that was compiled from the same csv
+    files, otherwise it is compiled and the cache is (re)written.
+    """
+    return _load_cached(csv_filepaths, cache_path, 'merged', lambda: ConnectorMatcher(
+        merge_connector_lists(read_connector_list(csv_filepath)
+                              for csv_filepath in csv_filepaths)))
+
+def load_language_matchers(langs=('de', 'en', 'it'),
+                           cache_path=LANGUAGE_CACHE_PATH):
+    """
+    Returns LanguageMatchers with one compiled ConnectorMatcher per language,
+    cached like load_connector_matcher.
+    """
+    csv_filepaths = connector_csvs(langs)
+    return _load_cached(csv_filepaths, cache_path, 'by_lang', lambda: LanguageMatchers({
+        lang: read_connector_list(csv_filepath)
+        for lang, csv_filepath in zip(langs, csv_filepaths)}))
+
+def _load_cached(csv_filepaths, cache_path, kind, compile_matcher):
+    """
+    Returns the matcher cached in cache_path if it was compiled from the same
+    csv files (as the same kind of matcher), otherwise compiles it and
+    (re)writes the cache.
+    """
+    key = _fingerprint(csv_filepaths, kind)
+    try:
+        with open(cache_path, 'rb') as f_in:
+            cached = pickle.load(f_in)
+        if cached['key'] == key:
+            return cached['matcher']
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError,
+            AttributeError, ImportError):
+        pass  # missing or outdated cache
+
+    matcher = compile_matcher()
+    matcher.fingerprint = key
+    # write to a temporary file first, so that readers never see half a cache
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f_out:
+        pickle.dump({'key': key, 'matcher': matcher}, f_out,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+    return matcher
+
+def _fingerprint(filepaths, kind='merged'):
+    """
+    Returns a hash of the cache version, the kind of matcher and the names and
+    contents of files.
+    """
+    sha = hashlib.sha256(f'{CACHE_VERSION} {kind}'.encode())
+    for filepath in filepaths:
+        sha.update(os.path.basename(filepath).encode())
+        with open(filepath, 'rb') as f_in:
+            sha.update(f_in.read())
+    return sha.hexdigest()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Reports connectors in the connector lists of several '
+                    'languages')
+    parser.add_argument('--langs', nargs='+', default=['de', 'en', 'it'])
+    args = parser.parse_args()
+    connector_lists = {lang: read_connector_list(csv_filepath) for lang,
+                       csv_filepath in zip(args.langs, connector_csvs(args.langs))}
+    collisions = find_collisions(connector_lists)
+    for connector, langs in collisions.items():
+        print(f"{connector}\t{' '.join(langs)}")
+    print(f'{len(collisions)} connectors in the lists of several languages')
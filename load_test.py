@@ -0,0 +1,85 @@
+"""
+Load test of a local alignment_server with sentence triples of the corpus.
+
+    python3 alignment_server.py --port 8765 &
+    python3 load_test.py --url http://127.0.0.1:8765 --clients 8 --seconds 10
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.request
+from corpus_reader import iter_sent_triples
+
+
+def run_load_test(url, triples, clients=8, seconds=10.0, batch_size=4,
+                  alignment='greedy'):
+    """
+    Lets clients threads post batches of batch_size triples to url/align for
+    the given seconds. Returns requests/s, triples/s and latency percentiles.
+    """
+    payloads = [
+        json.dumps({'triples': [triple._asdict() for triple
+                                in triples[start:start + batch_size]],
+                    'alignment': alignment}).encode('utf-8')
+        for start in range(0, len(triples), batch_size)
+        ]
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def client(offset):
+        i = offset
+        while time.monotonic() < deadline:
+            request = urllib.request.Request(
+                url.rstrip('/') + '/align', data=payloads[i % len(payloads)],
+                headers={'Content-Type': 'application/json'})
+            start = time.monotonic()
+            try:
+                with urllib.request.urlopen(request) as response:
+                    response.read()
+            except OSError as error:
+                with lock:
+                    errors.append(str(error))
+            else:
+                with lock:
+                    latencies.append(time.monotonic() - start)
+            i += clients
+
+    threads = [threading.Thread(target=client, args=(offset,))
+               for offset in range(clients)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    latencies.sort()
+    def percentile(p):
+        return latencies[min(int(p * len(latencies)), len(latencies) - 1)] \
+            if latencies else None
+    return {'requests': len(latencies), 'errors': len(errors),
+            'requests_per_second': len(latencies) / elapsed,
+            'triples_per_second': len(latencies) * batch_size / elapsed,
+            'latency_p50': percentile(0.5), 'latency_p95': percentile(0.95),
+            'latency_p99': percentile(0.99)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--url', default='http://127.0.0.1:8765')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--batch-size', type=int, default=4,
+                        help='triples per request')
+    parser.add_argument('--alignment', default='greedy')
+    args = parser.parse_args()
+
+    url = args.url
+    if not url.startswith(('http://127.', 'http://localhost', 'http://[::1]')):
+        parser.error('the load test only runs against local servers')
+    triples = list(iter_sent_triples('data/corpus'))
+    print(json.dumps(run_load_test(url, triples, args.clients, args.seconds,
+                                   args.batch_size, args.alignment), indent=2))
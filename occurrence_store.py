@@ -0,0 +1,135 @@
+"""Columnar store of all extracted and aligned connector occurrences."""
+import json
+import os
+import numpy as np
+
+# one entry per connector occurrence, except for relations: the relation ids
+# of occurrence i are relations[relation_offsets[i]:relation_offsets[i + 1]]
+COLUMNS = {
+    'doc': np.int32,
+    'edu': np.int32,
+    'triple': np.int64,
+    'lang': np.int8,
+    'start': np.int32,  # first token index of the connector
+    'end': np.int32,  # last token index + 1 (double connectors have a gap)
+    'connector': np.int32,
+    'group': np.int64,  # alignment group, shared by connectors of one color
+    'relation_offsets': np.int64,
+    'relations': np.int16,
+}
+# columns whose values are codes into a vocabulary
+VOCABS = ['doc', 'edu', 'lang', 'connector', 'relation']
+
+
+class OccurrenceStore:
+    """
+    Integer-coded columns of connector occurrences, built from the ChunkResults
+    of corpus_to_html, saved as one .npy file per column plus a vocab.json.
+    Pair statistics and relation breakdowns are computed with numpy.
+    """
+
+    def __init__(self, columns=None, vocabs=None):
+        if columns is None:
+            columns = {name: [] for name in COLUMNS}
+            columns['relation_offsets'].append(0)
+        self.columns = columns
+        # per vocabulary: {value: code}
+        self.vocabs = vocabs or {name: dict() for name in VOCABS}
+        self._triple_count = 0
+        self._group_count = 0
+
+    def __len__(self):
+        return len(self.columns['doc'])
+
+    def add(self, result):
+        """Adds all connector occurrences of a ChunkResult."""
+        columns = self.columns
+        for (doc_id, edu_id), (extracted, aligned) in zip(result.ids,
+                                                          result.connectors):
+            groups = dict()  # color -> group
+            for lang, connectors in extracted.items():
+                for tokens, indices, relations in connectors:
+                    color = aligned[lang].get(indices[0])
+                    if color not in groups:
+                        groups[color] = self._group_count
+                        self._group_count += 1
+                    columns['doc'].append(self.code('doc', doc_id))
+                    columns['edu'].append(self.code('edu', edu_id))
+                    columns['triple'].append(self._triple_count)
+                    columns['lang'].append(self.code('lang', lang))
+                    columns['start'].append(min(indices))
+                    columns['end'].append(max(indices) + 1)
+                    columns['connector'].append(
+                        self.code('connector', ' '.join(tokens).lower()))
+                    columns['group'].append(groups[color])
+                    columns['relations'].extend(
+                        self.code('relation', relation)
+                        for relation in relations)
+                    columns['relation_offsets'].append(
+                        len(columns['relations']))
+            self._triple_count += 1
+
+    def code(self, vocab, value):
+        """Returns the integer code of a value, adding it to the vocabulary."""
+        return self.vocabs[vocab].setdefault(value, len(self.vocabs[vocab]))
+
+    def array(self, name):
+        """Returns a column as numpy array."""
+        column = self.columns[name]
+        if not isinstance(column, np.ndarray):
+            column = np.asarray(column, dtype=COLUMNS[name])
+        return column
+
+    def save(self, dir_out):
+        """Saves all columns as .npy files and the vocabularies as json."""
+        os.makedirs(dir_out, exist_ok=True)
+        for name in COLUMNS:
+            np.save(os.path.join(dir_out, f'{name}.npy'), self.array(name))
+        with open(os.path.join(dir_out, 'vocab.json'), 'w',
+                  encoding='utf-8') as f_out:
+            json.dump({name: list(vocab) for name, vocab in self.vocabs.items()},
+                      f_out, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, dir_in, mmap_mode='r'):
+        """Loads a saved store, memory-mapping its columns by default."""
+        columns = {name: np.load(os.path.join(dir_in, f'{name}.npy'),
+                                 mmap_mode=mmap_mode)
+                   for name in COLUMNS}
+        with open(os.path.join(dir_in, 'vocab.json'), encoding='utf-8') as f_in:
+            vocabs = {name: {value: code for code, value in enumerate(values)}
+                      for name, values in json.load(f_in).items()}
+        return cls(columns, vocabs)
+
+    def pair_stats(self, lang_a, lang_b):
+        """
+        Returns [((connector in lang_a, connector in lang_b), count)] of all
+        alignment groups, most frequent first, like the *_stat.csv files
+        ('' where a group has no connector in a language).
+        """
+        groups = self.array('group')
+        langs = self.array('lang')
+        connectors = self.array('connector')
+        group_ids, group_codes = np.unique(groups, return_inverse=True)
+        pairs = np.full((len(group_ids), 2), -1, dtype=np.int64)
+        for column, lang in enumerate([lang_a, lang_b]):
+            mask = langs == self.vocabs['lang'][lang]
+            pairs[group_codes[mask], column] = connectors[mask]
+        unique_pairs, counts = np.unique(pairs, axis=0, return_counts=True)
+        names = np.array(list(self.vocabs['connector']) + [''], dtype=object)
+        order = np.argsort(-counts, kind='stable')
+        return [((names[unique_pairs[i, 0]], names[unique_pairs[i, 1]]),
+                 int(counts[i])) for i in order]
+
+    def relation_counts(self, lang=None):
+        """Returns {relation: number of occurrences} (of one language)."""
+        relations = self.array('relations')
+        if lang is not None:
+            offsets = self.array('relation_offsets')
+            mask = np.repeat(self.array('lang') == self.vocabs['lang'][lang],
+                             np.diff(offsets))
+            relations = relations[mask]
+        counts = np.bincount(relations, minlength=len(self.vocabs['relation']))
+        return {relation: int(counts[code])
+                for relation, code in self.vocabs['relation'].items()
+                if counts[code]}
@@ -0,0 +1,100 @@
+"""Tokenizer backends that return tokens together with their character offsets."""
+import re
+from collections import namedtuple
+
+# tokenized sentence: the raw text, its tokens and their (start, end) offsets
+TokenizedSent = namedtuple('TokenizedSent', 'text tokens spans')
+
+# nltk replaces double quotes by these tokens
+_QUOTE_TOKENS = {'``', "''"}
+
+# fast approximation of the treebank tokenization used by nltk.word_tokenize
+_TOKEN_RE = re.compile(r"""
+    \w+(?=n't\b)                    # do|n't
+    |n't\b
+    |\w+(?='(?:s|m|d|ll|re|ve)\b)   # it|'s
+    |'(?:s|m|d|ll|re|ve)\b
+    |\bcan(?=not\b)                 # can|not
+    |\w+(?:[-'./:]\w+)*             # words, elisions (l'età), 1.5, 60:87, a/b
+    |\.\.\.
+    |--
+    |[^\w\s]
+    """, re.VERBOSE | re.IGNORECASE)
+
+
+def tokenize(sent, backend='nltk'):
+    """Tokenizes a sentence with the given backend into a TokenizedSent."""
+    return TOKENIZERS[backend](sent)
+
+
+def _nltk_tokenize(sent):
+    """Tokenizes with nltk.word_tokenize and aligns the tokens to the text."""
+    # nltk takes longer to import than most runs need for tokenizing
+    from nltk.tokenize import word_tokenize
+    tokens = word_tokenize(sent)
+    return TokenizedSent(sent, tokens, _align_tokens(sent, tokens))
+
+
+def _regex_tokenize(sent):
+    """Tokenizes with a single regular expression (no sentence splitting)."""
+    tokens, spans = [], []
+    for match in _TOKEN_RE.finditer(sent):
+        token = match.group()
+        if token == '"':
+            # opening quote at the start or after a space/bracket, like nltk
+            opening = match.start() == 0 or sent[match.start() - 1] in ' ([{<'
+            token = '``' if opening else "''"
+        tokens.append(token)
+        spans.append(match.span())
+    return TokenizedSent(sent, tokens, spans)
+
+
+def _align_tokens(sent, tokens):
+    """Returns the (start, end) character offsets of the tokens in sent."""
+    spans = []
+    cursor = 0
+    for token in tokens:
+        start = sent.find(token, cursor)
+        if start == -1 and token in _QUOTE_TOKENS:
+            start = sent.find('"', cursor)
+            token = '"'
+        if start == -1:
+            # token was rewritten by the tokenizer, keep it at the cursor
+            start = cursor
+            token = ''
+        cursor = start + len(token)
+        spans.append((start, cursor))
+    return spans
+
+
+TOKENIZERS = {'nltk': _nltk_tokenize, 'regex': _regex_tokenize}
+# sentences of the bundled corpus that the regex backend tokenizes
+# differently from nltk, the parity check below fails beyond
+KNOWN_MISMATCHES = 38
+
+
+if __name__ == '__main__':
+    # parity check of the regex backend against nltk on the bundled corpus,
+    # failing if more sentences differ than the known ones (abbreviations
+    # like "etc." and truncated compounds like "Sonn-")
+    import os
+    import sys
+    from corpus_reader import all_xmls_to_sent_triples, list_xml_files
+
+    corpus_root = os.path.join('data', 'corpus')
+    all_sent_triples = all_xmls_to_sent_triples(
+        corpus_root,
+        list_xml_files(os.path.join(corpus_root, 'de'))
+        )
+    mismatches = 0
+    for triple in all_sent_triples:
+        for sent in triple:
+            expected = tokenize(sent, 'nltk').tokens
+            actual = tokenize(sent, 'regex').tokens
+            if expected != actual:
+                mismatches += 1
+                print(f'nltk:  {expected}\nregex: {actual}\n')
+    print(f'{mismatches} of {3 * len(all_sent_triples)} sentences differ '
+          f'({KNOWN_MISMATCHES} known)')
+    if mismatches > KNOWN_MISMATCHES:
+        sys.exit(1)